@@ -1,8 +1,11 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import json
-from utils.db import db_ctx
+import asyncio
+import os
+from utils.backup import ImportProgress, backup_name, export_backup, import_backup
+from utils.counters import repair_counters
+from utils.db import db_ctx, fetch_all
 from utils.embeds import make_admin_embed
 from utils.security import owner_only
 from datetime import datetime
@@ -14,23 +17,20 @@ class Admin(commands.Cog, name="Admin"):
     @app_commands.command(name="summon", description="(Owner only) Summon an NPC or artifact by ID.")
     @owner_only()
     async def summon(self, interaction: discord.Interaction, summon_type: str, template_id: int):
+        if summon_type == "npc":
+            column, label = "npc_id", "NPC"
+        elif summon_type == "artifact":
+            column, label = "artifact_id", "Artifact"
+        else:
+            await interaction.response.send_message("Invalid summon type.", ephemeral=True)
+            return
         async with db_ctx(self.bot.db) as db:
-            if summon_type == "npc":
-                await db.execute(
-                    "INSERT INTO inventory (player_id, npc_id, obtained_at) VALUES (?, ?, ?)",
-                    (interaction.user.id, template_id, int(datetime.utcnow().timestamp()))
-                )
-                await db.commit()
-                await interaction.response.send_message(f"NPC {template_id} summoned to your inventory.", ephemeral=True)
-            elif summon_type == "artifact":
-                await db.execute(
-                    "INSERT INTO inventory (player_id, artifact_id, obtained_at) VALUES (?, ?, ?)",
-                    (interaction.user.id, template_id, int(datetime.utcnow().timestamp()))
-                )
-                await db.commit()
-                await interaction.response.send_message(f"Artifact {template_id} summoned to your inventory.", ephemeral=True)
-            else:
-                await interaction.response.send_message("Invalid summon type.", ephemeral=True)
+            await db.execute(
+                f"INSERT INTO inventory (player_id, {column}, obtained_at) VALUES (?, ?, ?)",
+                (interaction.user.id, template_id, int(datetime.utcnow().timestamp()))
+            )
+            await db.commit()
+        await interaction.response.send_message(f"{label} {template_id} summoned to your inventory.", ephemeral=True)
 
     @app_commands.command(name="setspawnchannel", description="Set spawn channel for this server.")
     @commands.has_permissions(administrator=True)
@@ -43,39 +43,65 @@ class Admin(commands.Cog, name="Admin"):
             await db.commit()
         await interaction.response.send_message(f"Spawn channel set to {channel.mention}.", ephemeral=True)
 
-    @app_commands.command(name="backup_export", description="(Owner only) Export backup as JSON.")
+    @app_commands.command(name="backup_export", description="(Owner only) Export a backup (ndjson for /import, or a db snapshot).")
     @owner_only()
-    async def backup_export(self, interaction: discord.Interaction):
-        async with db_ctx(self.bot.db) as db:
-            tables = ["guilds", "players", "settlements", "buildings", "inventory", "artifacts", "active_spawns", "trades", "battles", "events", "logs"]
-            backup = {}
-            for t in tables:
-                async with db.execute(f"SELECT * FROM {t}") as cursor:
-                    backup[t] = [dict(zip([col[0] for col in cursor.description], row)) async for row in cursor]
-            backup_json = json.dumps(backup, indent=2)
-        await interaction.response.send_message(
-            "Backup exported. (Check DM for full JSON)", ephemeral=True
+    async def backup_export(self, interaction: discord.Interaction, fmt: str = "ndjson", compress: bool = True):
+        if fmt not in ("db", "ndjson"):
+            await interaction.response.send_message("Format must be `db` or `ndjson`.", ephemeral=True)
+            return
+        backup_cfg = self.bot.config["backup"]
+        await interaction.response.defer(ephemeral=True)
+        report = await export_backup(
+            self.bot.db.path, backup_cfg.get("directory", "backups"), fmt, compress,
+            backup_cfg.get("export_chunk_rows", 1000)
         )
-        await interaction.user.send(f"Here is your backup:\n```json\n{backup_json}\n```")
+        name = os.path.basename(report.path)
+        if report.bytes > backup_cfg.get("max_attachment_mb", 25) * 1024 * 1024:
+            await interaction.followup.send(f"Backup `{name}` exported: {report.summary()}. Too large to attach, kept on the host.", ephemeral=True)
+            return
+        await interaction.user.send(f"Here is your backup ({report.summary()}):", file=discord.File(report.path, filename=name))
+        await interaction.followup.send(f"Backup `{name}` exported: {report.summary()}. Check your DMs.", ephemeral=True)
 
-    @app_commands.command(name="import", description="(Owner only) Import backup from a JSON file.")
+    @app_commands.command(name="import", description="(Owner only) Import an NDJSON backup (from /backup_export fmt:ndjson).")
     @owner_only()
     async def import_backup(self, interaction: discord.Interaction, file: discord.Attachment):
-        data = await file.read()
+        backup_cfg = self.bot.config["backup"]
+        directory = backup_cfg.get("directory", "backups")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, backup_name("import", ".ndjson"))
+        await interaction.response.defer(ephemeral=True)
+        await file.save(path)
+        progress = ImportProgress()
+        message = await interaction.followup.send("Importing backup...", ephemeral=True, wait=True)
+        reporter = asyncio.create_task(self.report_import(message, progress))
         try:
-            backup = json.loads(data.decode())
-        except Exception:
-            await interaction.response.send_message("Invalid backup file.", ephemeral=True)
+            # Holding the writer keeps the bot's own writes out until the import commits;
+            # Discord is only called from the reporter task and after the lock is released
+            async with db_ctx(self.bot.db) as db:
+                try:
+                    report = await import_backup(self.bot.db.path, path, backup_cfg.get("import_batch_rows", 5000), progress)
+                except Exception as e:
+                    report, error = None, e
+                else:
+                    # Drop caches built from the replaced rows before anything else can write
+                    await self.bot.spawn_registry.load(db)
+                    await self.bot.spawn_expiry.load(db)
+                    self.bot.battles.reset()
+        finally:
+            reporter.cancel()
+            await asyncio.gather(reporter, return_exceptions=True)
+        if report is None:
+            await message.edit(content=f"Import failed and was rolled back: {error}")
             return
-        async with db_ctx(self.bot.db) as db:
-            for t, rows in backup.items():
-                await db.execute(f"DELETE FROM {t}")
-                for row in rows:
-                    keys = ", ".join(row.keys())
-                    placeholders = ", ".join("?" for _ in row)
-                    await db.execute(f"INSERT INTO {t} ({keys}) VALUES ({placeholders})", tuple(row.values()))
-            await db.commit()
-        await interaction.response.send_message("Backup imported successfully.", ephemeral=True)
+        await message.edit(content=f"Backup imported: {progress.summary()} in {report.duration:.2f}s.")
+
+    async def report_import(self, message, progress):
+        while True:
+            await asyncio.sleep(5)
+            try:
+                await message.edit(content=f"Importing backup... {progress.summary()}")
+            except discord.HTTPException:
+                pass
 
     @app_commands.command(name="botmode", description="(Owner only) Toggle bot premium mode.")
     @owner_only()
@@ -86,19 +112,44 @@ class Admin(commands.Cog, name="Admin"):
                 "INSERT OR REPLACE INTO settings(key, value) VALUES (?, ?)", ("bot_premium_mode", str(value))
             )
             await db.commit()
+        self.bot.entitlements.set_bot_mode(value)
         await interaction.response.send_message(f"Bot premium mode set to `{value}`.", ephemeral=True)
 
     @app_commands.command(name="logs", description="View audit logs (Owner only).")
     @owner_only()
     async def logs(self, interaction: discord.Interaction):
-        async with db_ctx(self.bot.db) as db:
-            async with db.execute(
-                "SELECT * FROM logs ORDER BY created_at DESC LIMIT 20"
-            ) as cursor:
-                logs = [dict(zip([col[0] for col in cursor.description], row)) async for row in cursor]
+        async with db_ctx(self.bot.db, readonly=True) as db:
+            logs = await fetch_all(db, "SELECT * FROM logs ORDER BY created_at DESC LIMIT 20")
         embed = make_admin_embed(logs)
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
+    @app_commands.command(name="dbstats", description="(Owner only) Show DB pool and group-commit stats.")
+    @owner_only()
+    async def dbstats(self, interaction: discord.Interaction):
+        pool = self.bot.db.stats
+        writes = self.bot.db.coalescer.report()
+        reads = pool["read_acquires"] or 1
+        lines = [
+            f"Reads: {pool['read_acquires']} • avg wait {pool['read_wait_total'] / reads * 1000:.2f}ms • max {pool['read_wait_max'] * 1000:.2f}ms",
+            f"Writer: {pool['write_acquires']} • max wait {pool['write_wait_max'] * 1000:.2f}ms",
+            f"Group commits: {writes['commits']} ({writes['commits_per_second']:.2f}/s) • avg batch {writes['avg_batch']:.1f} • max batch {writes['max_batch']} • failed {writes['failed_groups']}",
+        ]
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+    @app_commands.command(name="counters_repair", description="(Owner only) Recount player counters and report drift.")
+    @owner_only()
+    async def counters_repair(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        async with db_ctx(self.bot.db) as db:
+            drift = await repair_counters(db)
+        if not drift:
+            await interaction.followup.send("Player counters are in sync.", ephemeral=True)
+            return
+        lines = [d.describe() for d in drift[:15]]
+        if len(drift) > len(lines):
+            lines.append(f"...and {len(drift) - len(lines)} more")
+        await interaction.followup.send(f"Repaired {len(drift)} player(s):\n" + "\n".join(lines), ephemeral=True)
+
     @app_commands.command(name="nuke_test_data", description="(Owner only) Nuke all test data with multiple confirmations.")
     @owner_only()
     async def nuke_test_data(self, interaction: discord.Interaction):
@@ -112,11 +163,9 @@ class Admin(commands.Cog, name="Admin"):
         except asyncio.TimeoutError:
             await interaction.followup.send("Nuke cancelled (timeout).", ephemeral=True)
             return
-        async with db_ctx(self.bot.db) as db:
-            tables = ["guilds", "players", "settlements", "buildings", "inventory", "artifacts", "active_spawns", "trades", "battles", "events", "logs"]
-            for t in tables:
-                await db.execute(f"DELETE FROM {t}")
-            await db.commit()
+        tables = ["guilds", "players", "settlements", "buildings", "inventory", "artifacts", "active_spawns", "trades", "battles", "events", "logs"]
+        # One transaction, so a failure part-way leaves nothing half-deleted
+        await self.bot.db.commit_writes([(f"DELETE FROM {t}", ()) for t in tables])
         await interaction.followup.send("Test data nuked.", ephemeral=True)
 
 async def setup(bot):
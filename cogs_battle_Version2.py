@@ -3,7 +3,8 @@ from discord.ext import commands
 from discord import app_commands
 import random
 import asyncio
-from utils.db import db_ctx
+from utils.db import db_ctx, fetch_all, fetch_one, get_player_profile, BattleRow
+from utils.battle_engine import fetch_battle_tails, npc_combatant, player_combatant
 from utils.embeds import make_battle_embed, make_raid_phase_embed
 from utils.ui import BattleView
 from datetime import datetime
@@ -13,15 +14,56 @@ class Battle(commands.Cog, name="Battle"):
         self.bot = bot
         self.config = bot.config
 
+    async def cog_load(self):
+        self.bot.tick_engine.register(
+            "archive_battles", self.archive_battles, every=self.config["battle"].get("archive_every_ticks", 60)
+        )
+        self.bot.tick_engine.register("evict_idle_battles", self.evict_idle_battles)
+        self.bot.components.register("battle", self.battle_action, int, str)
+
+    def cog_unload(self):
+        self.bot.tick_engine.unregister("archive_battles")
+        self.bot.tick_engine.unregister("evict_idle_battles")
+        self.bot.components.unregister("battle")
+
+    async def evict_idle_battles(self):
+        checkpoints = self.bot.battles.evict_idle(int(datetime.utcnow().timestamp()))
+        if checkpoints:
+            await self.save_checkpoints(checkpoints, evict=True)
+
+    async def save_checkpoints(self, checkpoints, evict=False):
+        # In-memory state only moves on once the write has committed
+        await self.bot.db.commit_writes([statement for checkpoint in checkpoints for statement in checkpoint.statements])
+        self.bot.battles.saved(checkpoints, evict)
+
+    async def archive_battles(self):
+        # Finished battles keep only their compact replay (seed + action codes in
+        # state_json); their event rows and any legacy log_json are dropped
+        cutoff = int(datetime.utcnow().timestamp()) - self.config["battle"].get("archive_after_days", 7) * 86400
+        await self.bot.db.commit_writes([
+            (
+                "DELETE FROM battle_events WHERE battle_id IN "
+                "(SELECT id FROM battles WHERE status='finished' AND finished_at < ? AND state_json IS NOT NULL)",
+                (cutoff,)
+            ),
+            (
+                "UPDATE battles SET log_json=NULL WHERE status='finished' AND finished_at < ? AND log_json IS NOT NULL",
+                (cutoff,)
+            ),
+        ])
+
     @app_commands.command(name="pve_raid_start", description="Start a PvE raid against a boss NPC.")
     async def pve_raid_start(self, interaction: discord.Interaction):
-        async with db_ctx(self.bot.db) as db:
-            async with db.execute("SELECT * FROM npcs WHERE category='raid' OR category='boss' ORDER BY RANDOM() LIMIT 1") as cursor:
-                npc = await cursor.fetchone()
-            if not npc:
-                await interaction.response.send_message("No raid bosses available.", ephemeral=True)
-                return
-            battle_id = await self.create_battle(db, interaction.guild.id, "pve", interaction.user.id, npc_id=npc[0])
+        npc = self.bot.npc_registry.random_raid_boss()
+        if not npc:
+            await interaction.response.send_message("No raid bosses available.", ephemeral=True)
+            return
+        stats, abilities = self.bot.npc_registry.combat_profile(npc["id"])
+        async with db_ctx(self.bot.db, readonly=True) as db:
+            player = await self.player_combatant(db, interaction.user)
+        battle_id = await self.create_battle(
+            interaction.guild.id, "pve", [player, npc_combatant(npc, stats, abilities, self.config)], npc_id=npc["id"]
+        )
         await interaction.response.send_message(
             "Raid started! Prepare for battle...",
             embed=make_raid_phase_embed(npc),
@@ -34,79 +76,80 @@ class Battle(commands.Cog, name="Battle"):
         if user.id == interaction.user.id:
             await interaction.response.send_message("You cannot challenge yourself.", ephemeral=True)
             return
-        async with db_ctx(self.bot.db) as db:
-            battle_id = await self.create_battle(db, interaction.guild.id, "pvp", interaction.user.id, opponent_id=user.id)
+        async with db_ctx(self.bot.db, readonly=True) as db:
+            combatants = [await self.player_combatant(db, interaction.user), await self.player_combatant(db, user)]
+        battle_id = await self.create_battle(interaction.guild.id, "pvp", combatants, opponent_id=user.id)
         await interaction.response.send_message(
             f"{interaction.user.mention} challenged {user.mention}!",
             view=BattleView(battle_id, pve=False),
             ephemeral=False
         )
 
-    async def create_battle(self, db, guild_id, btype, challenger_id, opponent_id=None, npc_id=None):
+    async def player_combatant(self, db, user):
+        profile = await get_player_profile(db, user.id)
+        return player_combatant(user.id, user.display_name, profile.level if profile else 1, self.config)
+
+    async def create_battle(self, guild_id, btype, combatants, opponent_id=None, npc_id=None):
         started_at = int(datetime.utcnow().timestamp())
-        await db.execute(
-            "INSERT INTO battles (guild_id, type, challenger_id, opponent_id, status, started_at, log_json) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        seed = random.getrandbits(62)
+        state = self.bot.battles.start(None, btype, seed, combatants)
+        battle_id, _ = await self.bot.db.commit_write(
+            "INSERT INTO battles (guild_id, type, challenger_id, opponent_id, status, started_at, log_json, seed, state_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
             (
                 guild_id,
                 btype,
-                challenger_id,
+                combatants[0].id,
                 opponent_id if opponent_id else npc_id,
                 "active",
                 started_at,
-                "[]"
+                None,
+                seed,
+                state.snapshot()
             )
         )
-        await db.commit()
-        async with db.execute("SELECT last_insert_rowid()") as cursor:
-            row = await cursor.fetchone()
-        return row[0]
+        self.bot.battles.track(battle_id, state)
+        return battle_id
 
     @app_commands.command(name="battle_log", description="View your recent battle logs.")
     async def battle_log(self, interaction: discord.Interaction):
-        async with db_ctx(self.bot.db) as db:
-            async with db.execute(
-                "SELECT id, type, status, started_at, finished_at, log_json FROM battles WHERE challenger_id=? OR opponent_id=? ORDER BY started_at DESC LIMIT 6",
-                (interaction.user.id, interaction.user.id)
-            ) as cursor:
-                logs = [dict(zip([col[0] for col in cursor.description], row)) async for row in cursor]
+        async with db_ctx(self.bot.db, readonly=True) as db:
+            logs = await fetch_all(
+                db,
+                "SELECT id, type, status, started_at, finished_at, seed, state_json FROM battles WHERE challenger_id=? OR opponent_id=? ORDER BY started_at DESC LIMIT 6",
+                (interaction.user.id, interaction.user.id),
+                BattleRow
+            )
+            tails = await fetch_battle_tails(db, logs, self.config["battle"].get("log_tail", 3))
         if not logs:
             await interaction.response.send_message("No recent battles found.", ephemeral=True)
             return
-        embed = make_battle_embed(logs, interaction.user)
+        embed = make_battle_embed(logs, interaction.user, tails)
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
-    @commands.Cog.listener()
-    async def on_button_click(self, interaction: discord.Interaction):
-        if not interaction.data or not interaction.data.get("custom_id", "").startswith("battle_"):
+    async def battle_action(self, interaction: discord.Interaction, battle_id: int, action: str):
+        # Attack/Defend/Special buttons of BattleView, routed by utils.components
+        if self.bot.rate_limiters["battle_action"].check(interaction.user.id):
+            await interaction.response.send_message("Slow down! Wait a moment before acting again.", ephemeral=True)
             return
-        parts = interaction.data["custom_id"].split("_")
-        if len(parts) < 3:
+        state = self.bot.battles.get(battle_id)
+        if state is None:
+            # Not in memory (e.g. after a restart): rebuild from the last checkpoint
+            async with db_ctx(self.bot.db, readonly=True) as db:
+                battle = await fetch_one(db, "SELECT * FROM battles WHERE id=?", (battle_id,), BattleRow)
+            state = battle and self.bot.battles.restore(battle)
+        if not state:
+            await interaction.response.send_message("Battle is not active.", ephemeral=True)
             return
-        battle_id = int(parts[1])
-        action = parts[2]
-        async with db_ctx(self.bot.db) as db:
-            async with db.execute("SELECT * FROM battles WHERE id=?", (battle_id,)) as cursor:
-                battle = await cursor.fetchone()
-            if not battle or battle[5] != "active":
-                await interaction.response.send_message("Battle is not active.", ephemeral=True)
-                return
-            random.seed(battle_id + int(datetime.utcnow().timestamp()))
-            result, log = await self.perform_battle_action(db, battle, interaction.user.id, action)
-            await db.execute(
-                "UPDATE battles SET log_json=json_insert(log_json, '$[#]', ?) WHERE id=?",
-                (log, battle_id)
-            )
-            if result == "win":
-                await db.execute("UPDATE battles SET status='finished', finished_at=? WHERE id=?",
-                                 (int(datetime.utcnow().timestamp()), battle_id))
-            await db.commit()
-            await interaction.response.send_message(log, ephemeral=False)
-
-    async def perform_battle_action(self, db, battle, user_id, action):
-        if random.random() < 0.5:
-            return "win", f"{user_id} performed {action} and won the round!"
-        else:
-            return "continue", f"{user_id} performed {action}. The battle continues..."
+        problem = state.check(interaction.user.id, action)
+        if problem:
+            await interaction.response.send_message(problem, ephemeral=True)
+            return
+        events = state.apply(interaction.user.id, action)
+        await interaction.response.send_message("\n".join(state.describe(event) for event in events), ephemeral=False)
+        # A state dropped while this action ran (e.g. by an import) is no longer tracked:
+        # save it right away
+        if self.bot.battles.checkpoint_due(state) or self.bot.battles.active.get(battle_id) is not state:
+            await self.save_checkpoints([self.bot.battles.checkpoint(state, int(datetime.utcnow().timestamp()))])
 
 async def setup(bot):
     await bot.add_cog(Battle(bot))
\ No newline at end of file
@@ -11,18 +11,19 @@ class Core(commands.Cog, name="Core"):
     @app_commands.command(name="register", description="Register your player profile.")
     async def register(self, interaction: discord.Interaction):
         user = interaction.user
-        async with db_ctx(self.bot.db) as db:
+        async with db_ctx(self.bot.db, readonly=True) as db:
             profile = await get_player_profile(db, user.id)
-            if profile:
-                await interaction.response.send_message("Already registered.", ephemeral=True)
-                return
+        if profile:
+            await interaction.response.send_message("Already registered.", ephemeral=True)
+            return
+        async with db_ctx(self.bot.db) as db:
             await upsert_player_profile(db, user.id, user.display_name)
         await interaction.response.send_message("Registration successful!", ephemeral=True)
 
     @app_commands.command(name="profile", description="View a player's profile.")
     async def profile(self, interaction: discord.Interaction, user: discord.User = None):
         user = user or interaction.user
-        async with db_ctx(self.bot.db) as db:
+        async with db_ctx(self.bot.db, readonly=True) as db:
             profile = await get_player_profile(db, user.id)
         if not profile:
             await interaction.response.send_message("Profile not found.", ephemeral=True)
@@ -3,9 +3,10 @@ from discord.ext import commands
 from discord import app_commands
 import random
 import asyncio
-import json
+from utils.counters import get_counters
 from utils.db import db_ctx
 from utils.embeds import make_crafting_embed
+from utils.entitlements import INVENTORY_PAGE_SIZE
 from utils.ui import CraftingView
 from datetime import datetime
 
@@ -14,46 +15,74 @@ class Crafting(commands.Cog, name="Crafting"):
         self.bot = bot
         self.config = bot.config
 
+    async def cog_load(self):
+        self.bot.components.register("craft", self.craft_button, int, str)
+
+    def cog_unload(self):
+        self.bot.components.unregister("craft")
+
+    async def craft_button(self, interaction: discord.Interaction, recipe_id: int, action: str):
+        if action == "start":
+            await self.start_craft(interaction, recipe_id)
+
     @app_commands.command(name="craft_list", description="List available crafting recipes.")
     async def craft_list(self, interaction: discord.Interaction):
-        with open("data/artifacts.json", "r", encoding="utf-8") as f:
-            recipes = json.load(f)
+        # Loaded once and hot-reloaded by utils.master_data
+        recipes = self.bot.master_data.artifacts
+        if not recipes:
+            await interaction.response.send_message("No crafting recipes available.", ephemeral=True)
+            return
         embed = make_crafting_embed(recipes)
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.response.send_message(embed=embed, view=CraftingView(recipes), ephemeral=True)
 
     @app_commands.command(name="craft_start", description="Start crafting a recipe.")
     async def craft_start(self, interaction: discord.Interaction, recipe_id: int):
-        async with db_ctx(self.bot.db) as db:
-            async with db.execute(
-                "SELECT COUNT(*) FROM inventory WHERE player_id=? AND artifact_id IS NOT NULL",
-                (interaction.user.id,)
-            ) as cursor:
-                count = (await cursor.fetchone())[0]
-            if count >= self.config["crafting"]["queue_max_length"]:
-                await interaction.response.send_message("Your crafting queue is full.", ephemeral=True)
-                return
-            await db.execute(
-                "INSERT INTO inventory (player_id, artifact_id, obtained_at) VALUES (?, ?, ?)",
-                (interaction.user.id, recipe_id, int(datetime.utcnow().timestamp()))
+        await self.start_craft(interaction, recipe_id)
+
+    async def start_craft(self, interaction, recipe_id):
+        # Limit checks and insert in one statement so it can ride a group commit; the
+        # checks read the trigger-maintained player_counters row instead of counting
+        perks = self.bot.entitlements.perks(interaction.user.id, interaction.guild.id if interaction.guild else None)
+        queue_max = self.config["crafting"]["queue_max_length"]
+        _, inserted = await self.bot.db.commit_write(
+            "INSERT INTO inventory (player_id, artifact_id, obtained_at) SELECT ?, ?, ? "
+            "WHERE NOT EXISTS (SELECT 1 FROM player_counters WHERE player_id=? AND (artifacts >= ? OR items >= ?))",
+            (
+                interaction.user.id, recipe_id, int(datetime.utcnow().timestamp()),
+                interaction.user.id, queue_max, perks.inventory_slots
             )
-            await db.commit()
+        )
+        if not inserted:
+            async with db_ctx(self.bot.db, readonly=True) as db:
+                counters = await get_counters(db, interaction.user.id)
+            if counters.artifacts >= queue_max:
+                await interaction.response.send_message("Your crafting queue is full.", ephemeral=True)
+            else:
+                await interaction.response.send_message(
+                    f"Your inventory is full ({perks.inventory_pages} pages of {INVENTORY_PAGE_SIZE}).", ephemeral=True
+                )
+            return
         await interaction.response.send_message("Crafting started!", ephemeral=True)
 
     @app_commands.command(name="fusion_start", description="Start a fusion process for rare artifacts.")
     async def fusion_start(self, interaction: discord.Interaction, artifact_id1: int, artifact_id2: int):
-        shiny_chance = self.config["crafting"]["fusion_shiny_chance"]
+        perks = self.bot.entitlements.perks(interaction.user.id, interaction.guild.id if interaction.guild else None)
+        shiny_chance = self.config["crafting"]["fusion_shiny_chance"] * perks.shiny_multiplier
         proc_chance = self.config["crafting"]["artifact_proc_chance"]
         shiny = random.random() < shiny_chance
         proc = random.random() < proc_chance
-        async with db_ctx(self.bot.db) as db:
-            await db.execute("DELETE FROM inventory WHERE player_id=? AND artifact_id IN (?, ?)",
-                             (interaction.user.id, artifact_id1, artifact_id2))
-            fused_artifact_id = random.randint(100, 999)
-            await db.execute(
+        fused_artifact_id = random.randint(100, 999)
+        # Both statements commit together: the inputs are never consumed without the result
+        await self.bot.db.commit_writes([
+            (
+                "DELETE FROM inventory WHERE player_id=? AND artifact_id IN (?, ?)",
+                (interaction.user.id, artifact_id1, artifact_id2)
+            ),
+            (
                 "INSERT INTO inventory (player_id, artifact_id, obtained_at) VALUES (?, ?, ?)",
                 (interaction.user.id, fused_artifact_id, int(datetime.utcnow().timestamp()))
-            )
-            await db.commit()
+            ),
+        ])
         msg = "Fusion complete!"
         if shiny:
             msg += " ✨ You unlocked a shiny variant!"
@@ -2,53 +2,127 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import asyncio
-from utils.db import db_ctx
-from utils.embeds import make_trade_embed
-from utils.ui import TradeView
+from typing import Optional
+from utils.db import db_ctx, fetch_one, TradeRow
+from utils.components import component_id
+from utils.embeds import make_market_embed, make_trade_embed
+from utils.market import ITEM_TYPES, browse_offers, seller_offers
+from utils.ui import MarketView
+from utils.security import rate_limited
 from datetime import datetime
 
+def optional_int(value):
+    return int(value) if value else None
+
 class Trade(commands.Cog, name="Trade"):
     def __init__(self, bot):
         self.bot = bot
         self.config = bot.config
 
+    async def cog_load(self):
+        components = self.bot.components
+        components.register("trade", self.trade_button, int, str)
+        # Next-page buttons: filters, page number, then the (price, id) / (created_at, id) cursor
+        components.register("market", self.market_page, str, optional_int, optional_int, int, int, int)
+        components.register("myoffers", self.own_offers_page, int, int, int)
+
+    def cog_unload(self):
+        for prefix in ("trade", "market", "myoffers"):
+            self.bot.components.unregister(prefix)
+
+    async def trade_button(self, interaction: discord.Interaction, trade_id: int, action: str):
+        if action == "accept":
+            await self.accept_trade(interaction, trade_id)
+
     @app_commands.command(name="trade_offer_create", description="Create a trade offer in the marketplace.")
+    @rate_limited("trade_create")
     async def trade_offer_create(self, interaction: discord.Interaction, item_type: str, item_id: int, price: int):
-        async with db_ctx(self.bot.db) as db:
-            await db.execute(
-                "INSERT INTO trades (seller_id, item_type, item_id, price, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
-                (interaction.user.id, item_type, item_id, price, "open", int(datetime.utcnow().timestamp()))
+        _, inserted = await self.bot.db.commit_write(
+            "INSERT INTO trades (seller_id, item_type, item_id, price, status, created_at) "
+            "SELECT ?, ?, ?, ?, ?, ? WHERE COALESCE((SELECT open_offers FROM player_counters WHERE player_id=?), 0) < ?",
+            (
+                interaction.user.id, item_type, item_id, price, "open", int(datetime.utcnow().timestamp()),
+                interaction.user.id, self.config["trade"]["max_offers_per_user"]
             )
-            await db.commit()
+        )
+        if not inserted:
+            await interaction.response.send_message(
+                f"You already have {self.config['trade']['max_offers_per_user']} open offers.", ephemeral=True
+            )
+            return
         await interaction.response.send_message("Trade offer created!", ephemeral=True)
 
     @app_commands.command(name="trade_list", description="List your open trade offers.")
     async def trade_list(self, interaction: discord.Interaction):
-        async with db_ctx(self.bot.db) as db:
-            async with db.execute(
-                "SELECT * FROM trades WHERE seller_id=? AND status='open' ORDER BY created_at DESC LIMIT ?",
-                (interaction.user.id, self.config["trade"]["pagination_size"])
-            ) as cursor:
-                offers = [dict(zip([col[0] for col in cursor.description], row)) async for row in cursor]
-        if not offers:
+        await self.show_own_offers(interaction, 1, None)
+
+    async def own_offers_page(self, interaction: discord.Interaction, page: int, created_at: int, trade_id: int):
+        await self.show_own_offers(interaction, page, (created_at, trade_id), edit=True)
+
+    async def show_own_offers(self, interaction, page, before, edit=False):
+        async with db_ctx(self.bot.db, readonly=True) as db:
+            result = await seller_offers(db, interaction.user.id, before, self.config["trade"]["pagination_size"])
+        if not result.offers:
             await interaction.response.send_message("No open trade offers.", ephemeral=True)
             return
-        embed = make_trade_embed(offers, interaction.user)
-        await interaction.response.send_message(embed=embed, view=TradeView(offers), ephemeral=True)
+        next_id = result.next_cursor and component_id("myoffers", page + 1, *result.next_cursor)
+        await self.respond(interaction, make_trade_embed(result.offers, interaction.user), MarketView(result.offers, next_id), edit)
+
+    @app_commands.command(name="market_browse", description="Browse open marketplace offers, cheapest first.")
+    @app_commands.describe(item_type="npc, artifact or resource", min_price="Lowest price to show", max_price="Highest price to show")
+    async def market_browse(
+        self,
+        interaction: discord.Interaction,
+        item_type: Optional[str] = None,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None
+    ):
+        if item_type is not None and item_type.lower() not in ITEM_TYPES:
+            await interaction.response.send_message(f"Item type must be one of: {', '.join(ITEM_TYPES)}.", ephemeral=True)
+            return
+        await self.show_market(interaction, item_type and item_type.lower(), min_price, max_price, 1, None)
+
+    async def market_page(self, interaction: discord.Interaction, item_type: str, min_price, max_price, page: int, price: int, trade_id: int):
+        await self.show_market(interaction, item_type or None, min_price, max_price, page, (price, trade_id), edit=True)
+
+    async def show_market(self, interaction, item_type, min_price, max_price, page, after, edit=False):
+        async with db_ctx(self.bot.db, readonly=True) as db:
+            result = await browse_offers(
+                db, item_type, min_price, max_price, after, self.config["trade"]["pagination_size"]
+            )
+        if not result.offers:
+            await interaction.response.send_message("No matching offers.", ephemeral=True)
+            return
+        next_id = result.next_cursor and component_id(
+            "market", item_type or "", "" if min_price is None else min_price, "" if max_price is None else max_price,
+            page + 1, *result.next_cursor
+        )
+        embed = make_market_embed(result.offers, page, item_type, min_price, max_price)
+        await self.respond(interaction, embed, MarketView(result.offers, next_id), edit)
+
+    async def respond(self, interaction, embed, view, edit):
+        # Next-page clicks replace the page in place; commands post a new ephemeral message
+        if edit:
+            await interaction.response.edit_message(embed=embed, view=view)
+        else:
+            await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
 
     @app_commands.command(name="trade_accept", description="Accept a trade offer.")
     async def trade_accept(self, interaction: discord.Interaction, trade_id: int):
+        await self.accept_trade(interaction, trade_id)
+
+    async def accept_trade(self, interaction, trade_id):
         async with db_ctx(self.bot.db) as db:
-            async with db.execute("SELECT * FROM trades WHERE id=? AND status='open'", (trade_id,)) as cursor:
-                trade = await cursor.fetchone()
-            if not trade:
-                await interaction.response.send_message("Trade not found or already closed.", ephemeral=True)
-                return
-            await db.execute(
-                "UPDATE trades SET status='accepted', buyer_id=?, accepted_at=? WHERE id=?",
-                (interaction.user.id, int(datetime.utcnow().timestamp()), trade_id)
-            )
-            await db.commit()
+            trade = await fetch_one(db, "SELECT * FROM trades WHERE id=? AND status='open'", (trade_id,), TradeRow)
+            if trade:
+                await db.execute(
+                    "UPDATE trades SET status='accepted', buyer_id=?, accepted_at=? WHERE id=?",
+                    (interaction.user.id, int(datetime.utcnow().timestamp()), trade_id)
+                )
+                await db.commit()
+        if not trade:
+            await interaction.response.send_message("Trade not found or already closed.", ephemeral=True)
+            return
         await interaction.response.send_message("Trade accepted!", ephemeral=True)
 
 async def setup(bot):
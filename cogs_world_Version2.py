@@ -1,63 +1,67 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 import asyncio
-import json
+import logging
+from functools import partial
+import numpy as np
 from utils.db import db_ctx
+from utils.counters import repair_counters
 from utils.embeds import make_world_summary_embed
-from datetime import datetime
+from utils.settlements import get_guild_settlements
+from utils.world_sim import simulate_npc_tick
+
+logger = logging.getLogger("elysium.world")
 
 class World(commands.Cog, name="World"):
     def __init__(self, bot):
         self.bot = bot
         self.config = bot.config
-        self.world_tick_task.start()
+        self.npc_rng = np.random.default_rng(self.config.get("world_seed"))
+        self.backup_task = None
+
+    async def cog_load(self):
+        tick_cfg = self.config.get("world_tick", {})
+        engine = self.bot.tick_engine
+        # No settlement phase: resources accrue lazily when read (see utils.settlements)
+        engine.register("simulate_npcs", partial(self.run_phase, self.simulate_npcs))
+        engine.register("backup_world", self.backup_world, every=tick_cfg.get("backup_every_ticks", 15))
+        engine.register("send_world_summaries", partial(self.run_phase, self.send_world_summaries, readonly=True), every=tick_cfg.get("summary_every_ticks", 60))
+        engine.register("repair_counters", partial(self.run_phase, self.repair_counters), every=tick_cfg.get("counter_repair_every_ticks", 1440))
 
     def cog_unload(self):
-        self.world_tick_task.cancel()
+        for name in ("simulate_npcs", "backup_world", "send_world_summaries", "repair_counters"):
+            self.bot.tick_engine.unregister(name)
 
-    @tasks.loop(seconds=60)
-    async def world_tick_task(self):
-        await self.world_tick()
+    async def run_phase(self, phase, readonly=False):
+        async with db_ctx(self.bot.db, readonly=readonly) as db:
+            await phase(db)
 
-    async def world_tick(self):
-        async with db_ctx(self.bot.db) as db:
-            await self.simulate_settlements(db)
-            await self.simulate_npcs(db)
-            await self.backup_world(db)
-            await self.send_world_summaries(db)
+    async def simulate_npcs(self, db, rng=None):
+        await simulate_npc_tick(db, rng or self.npc_rng)
 
-    async def simulate_settlements(self, db):
-        async with db.execute("SELECT id, resources_json FROM settlements") as cursor:
-            settlements = [dict(zip([column[0] for column in cursor.description], row)) async for row in cursor]
-        for settlement in settlements:
-            resources = json.loads(settlement["resources_json"] or "{}")
-            resources["food"] = resources.get("food", 0) + 5
-            resources["wood"] = resources.get("wood", 0) + 2
-            resources["stone"] = resources.get("stone", 0) + 1
-            await db.execute(
-                "UPDATE settlements SET resources_json=? WHERE id=?",
-                (json.dumps(resources), settlement["id"])
-            )
-        await db.commit()
+    async def repair_counters(self, db):
+        # Safety net for the player_counters triggers; drift means some write bypassed them
+        drift = await repair_counters(db)
+        if drift:
+            logger.warning(f"Repaired {len(drift)} drifted player counter(s): " + "; ".join(d.describe() for d in drift[:10]))
 
-    async def simulate_npcs(self, db):
-        async with db.execute("SELECT * FROM world_npcs WHERE status='active'") as cursor:
-            npcs = [dict(zip([column[0] for column in cursor.description], row)) async for row in cursor]
-        for npc in npcs:
-            if random.random() < 0.03:
-                await db.execute(
-                    "UPDATE world_npcs SET job=?, migrated_at=? WHERE id=?",
-                    ("scout" if npc["job"] != "scout" else "worker", int(datetime.utcnow().timestamp()), npc["id"])
-                )
-            if random.random() < 0.005 and not npc["converted_to_collectible"]:
-                await db.execute(
-                    "UPDATE world_npcs SET converted_to_collectible=1 WHERE id=?",
-                    (npc["id"],)
-                )
-        await db.commit()
+    async def backup_world(self):
+        # Started in the background: the tick never waits on a snapshot
+        if not self.config["backup"].get("auto_backup_enabled", True):
+            return
+        if self.backup_task and not self.backup_task.done():
+            return
+        self.backup_task = asyncio.create_task(self.bot.backups.run_due())
+        self.backup_task.add_done_callback(self.log_backup)
 
-    async def backup_world(self, db):
-        pass
+    def log_backup(self, task):
+        if task.cancelled():
+            return
+        if task.exception():
+            logger.error(f"World backup failed: {task.exception()}")
+        elif task.result():
+            entry = task.result()
+            logger.info(f"World backup ({entry['kind']}) written to {entry['file']} in {entry['duration']}s")
 
     async def send_world_summaries(self, db):
         for guild in self.bot.guilds:
@@ -65,22 +69,20 @@ class World(commands.Cog, name="World"):
             channel = guild.get_channel(chan_id) if chan_id else guild.system_channel
             if not channel:
                 continue
-            async with db.execute("SELECT name, level FROM settlements WHERE guild_id=?", (guild.id,)) as cursor:
-                settlements = [dict(zip([column[0] for column in cursor.description], row)) async for row in cursor]
+            settlements = await get_guild_settlements(db, guild.id, self.config.get("tick_interval", 60))
             if settlements:
                 embed = make_world_summary_embed(settlements, guild)
                 await channel.send(embed=embed)
 
     @commands.command(name="world_summary")
     async def world_summary(self, ctx):
-        async with db_ctx(self.bot.db) as db:
-            async with db.execute("SELECT name, level FROM settlements WHERE guild_id=?", (ctx.guild.id,)) as cursor:
-                settlements = [dict(zip([column[0] for column in cursor.description], row)) async for row in cursor]
-            if not settlements:
-                await ctx.send("No settlements found.")
-                return
-            embed = make_world_summary_embed(settlements, ctx.guild)
-            await ctx.send(embed=embed)
+        async with db_ctx(self.bot.db, readonly=True) as db:
+            settlements = await get_guild_settlements(db, ctx.guild.id, self.config.get("tick_interval", 60))
+        if not settlements:
+            await ctx.send("No settlements found.")
+            return
+        embed = make_world_summary_embed(settlements, ctx.guild)
+        await ctx.send(embed=embed)
 
 async def setup(bot):
     await bot.add_cog(World(bot))
\ No newline at end of file
@@ -1,3 +1,6 @@
+import time
+_process_start = time.perf_counter()
+
 import os
 import sys
 import asyncio
@@ -5,7 +8,20 @@ import logging
 import json
 from discord.ext import commands, tasks
 import discord
-import aiosqlite
+from utils.db import DBPool, db_ctx, run_migrations
+from utils.npc_registry import NPCRegistry
+from utils.spawn_registry import ActiveSpawnRegistry
+from utils.spawn_expiry import SpawnExpiry
+from utils.tick_engine import TickEngine
+from utils.premium_scheduler import PremiumExpiryScheduler
+from utils.entitlements import Entitlements
+from utils.security import build_rate_limiters
+from utils.backup import BackupService
+from utils.battle_engine import BattleEngine
+from utils.startup import StartupProfiler, sync_command_tree
+from utils.components import ComponentRouter
+from utils.master_data import MasterData
+_imports_done = time.perf_counter()
 
 # --- CONFIG LOADING ---
 
@@ -19,6 +35,8 @@ def load_config():
 
 config = load_config()
 
+CORE_COGS = ("cogs.core", "cogs.spawn", "cogs.world", "cogs.battle", "cogs.trade", "cogs.crafting")
+
 # --- LOGGING SETUP ---
 logging.basicConfig(
     level=logging.INFO,
@@ -37,16 +55,6 @@ intents.dm_messages = True
 intents.presences = False
 intents.reactions = True
 
-# --- MIGRATION RUNNER ---
-
-async def run_migrations(db: aiosqlite.Connection):
-    # Read migrations.sql and apply if needed
-    with open(MIGRATIONS_PATH, "r", encoding="utf-8") as f:
-        sql = f.read()
-    await db.executescript(sql)
-    await db.commit()
-    logger.info("DB migrations applied.")
-
 # --- BOT DEFINITION ---
 
 class ElysiumBot(commands.Bot):
@@ -58,37 +66,111 @@ class ElysiumBot(commands.Bot):
         )
         self.config = config
         self.db = None
+        self.npc_registry = NPCRegistry(config["rarity_weights"])
+        self.spawn_registry = ActiveSpawnRegistry()
+        expiry_cfg = config.get("spawn_expiry", {})
+        self.spawn_expiry = SpawnExpiry(
+            self,
+            tick=expiry_cfg.get("tick_seconds", 1),
+            batch_seconds=expiry_cfg.get("batch_seconds", 2),
+            max_concurrent_edits=expiry_cfg.get("max_concurrent_edits", 4),
+            edit_messages=expiry_cfg.get("edit_expired_messages", True)
+        )
+        self.tick_engine = TickEngine(
+            config.get("tick_interval", 60),
+            max_catchup=config.get("world_tick", {}).get("max_catchup", 0)
+        )
+        self.premium_scheduler = PremiumExpiryScheduler(self)
+        self.entitlements = Entitlements(config)
+        self.rate_limiters = build_rate_limiters(config)
+        self.battles = BattleEngine(config)
+        self.components = ComponentRouter()
+        master_cfg = config.get("master_data", {})
+        self.master_data = MasterData(
+            self,
+            npcs_path=master_cfg.get("npcs_path", "data/npcs.json"),
+            artifacts_path=master_cfg.get("artifacts_path", "data/artifacts.json"),
+            poll_seconds=master_cfg.get("poll_seconds", 5)
+        )
+        self.backups = None
+        self.profiler = StartupProfiler(_process_start)
+        self.profiler.record("imports", _imports_done - _process_start)
         self._ready = asyncio.Event()
         self.bg_tasks = []
 
     async def setup_hook(self):
+        profiler = self.profiler
         # DB connect and run migrations
-        self.db = await aiosqlite.connect(DB_PATH, isolation_level=None)
-        await run_migrations(self.db)
-        # Load cogs
-        await self.load_all_cogs()
+        batch_cfg = config.get("db_write_batch", {})
+        self.db = DBPool(
+            DB_PATH,
+            readers=config.get("db_readers", 4),
+            flush_interval=batch_cfg.get("flush_ms", 5) / 1000,
+            max_batch_statements=batch_cfg.get("max_statements", 200)
+        )
+        with profiler.phase("db open"):
+            await self.db.open()
+        with profiler.phase("migrations"):
+            applied = await run_migrations(self.db.writer, MIGRATIONS_PATH)
+        if applied:
+            logger.info(f"DB migrations applied: {applied}")
+        with profiler.phase("db readers"):
+            await self.db.open_readers()
+        backup_cfg = config["backup"]
+        self.backups = BackupService(
+            DB_PATH,
+            backup_cfg.get("auto_directory", "backups/auto"),
+            full_interval_hours=backup_cfg["auto_backup_interval_hours"],
+            retention_days=backup_cfg["retention_days"],
+            chunk_rows=backup_cfg.get("export_chunk_rows", 1000)
+        )
+        with profiler.phase("master data"):
+            await self.master_data.refresh()
+        with profiler.phase("state load"):
+            async with db_ctx(self.db, readonly=True) as db:
+                await self.npc_registry.load(db)
+                await self.spawn_registry.load(db)
+                await self.spawn_expiry.load(db)
+                await self.premium_scheduler.load(db)
+                await self.entitlements.load(db)
+        # Gameplay cogs now; the rest once the bot is serving (see load_deferred_cogs)
+        await self.load_cogs(CORE_COGS)
         # Start background tasks
         self.bg_tasks.append(self.loop.create_task(self.world_tick_task()))
         self.bg_tasks.append(self.loop.create_task(self.premium_expiry_task()))
-        self.bg_tasks.append(self.loop.create_task(self.spawn_cleanup_task()))
+        self.bg_tasks.append(self.loop.create_task(self.spawn_expiry_task()))
+        self.bg_tasks.append(self.loop.create_task(self.master_data.run()))
+        self.bg_tasks.append(self.loop.create_task(self.load_deferred_cogs()))
         self._ready.set()
         logger.info("Elysium bot setup complete.")
 
-    async def load_all_cogs(self):
-        await self.load_extension("cogs.core")
-        await self.load_extension("cogs.spawn")
-        await self.load_extension("cogs.world")
-        await self.load_extension("cogs.battle")
-        await self.load_extension("cogs.trade")
-        await self.load_extension("cogs.crafting")
-        await self.load_extension("cogs.premium")
-        await self.load_extension("cogs.admin")
+    async def load_cogs(self, names):
+        for name in names:
+            with self.profiler.phase(f"load {name}"):
+                await self.load_extension(name)
+
+    async def load_deferred_cogs(self):
+        # Admin/premium commands are not needed to serve spawns and claims
+        await self.wait_until_ready()
+        startup_cfg = config.get("startup", {})
+        try:
+            await self.load_cogs(startup_cfg.get("deferred_cogs", ["cogs.premium", "cogs.admin"]))
+        except Exception as e:
+            logger.error(f"Deferred cog load failed: {e}")
         logger.info("All cogs loaded.")
+        if startup_cfg.get("sync_commands", True):
+            with self.profiler.phase("command sync"):
+                try:
+                    await sync_command_tree(self)
+                except Exception as e:
+                    logger.error(f"Command tree sync failed: {e}")
+        logger.info(self.profiler.report())
 
     async def close(self):
         for task in self.bg_tasks:
             task.cancel()
         if self.db:
+            # Flushes queued group-commit writes before the connections close
             await self.db.close()
         await super().close()
         logger.info("Bot shutdown complete.")
@@ -96,6 +178,11 @@ class ElysiumBot(commands.Bot):
     async def on_ready(self):
         logger.info(f"Logged in as {self.user} ({self.user.id})")
 
+    async def on_interaction(self, interaction):
+        # Buttons of every view are routed by custom_id (see utils.components)
+        if interaction.type == discord.InteractionType.component:
+            await self.components.dispatch(interaction)
+
     async def on_guild_join(self, guild):
         await self.send_guild_owner_dm(guild)
 
@@ -118,34 +205,9 @@ class ElysiumBot(commands.Bot):
             logger.warning(f"Failed to DM server owner {owner} in guild {guild.name}: {e}")
 
     async def premium_expiry_task(self):
-        # Periodically (every hour) check for soon-to-expire and expired premium entries
-        while not self.is_closed():
-            try:
-                await self._ready.wait()
-                await self.handle_premium_expiry()
-            except Exception as e:
-                logger.error(f"Premium expiry task error: {e}")
-            await asyncio.sleep(3600)
-
-    async def handle_premium_expiry(self):
-        # 7d and 48h pre-expiry reminders, expiry notifications
-        async with self.db.execute(
-            "SELECT id, kind, user_id, guild_id, expires_at, notified_7d, notified_48h FROM premium WHERE expires_at IS NOT NULL"
-        ) as cursor:
-            rows = await cursor.fetchall()
-        now = int(asyncio.get_event_loop().time())
-        for row in rows:
-            id, kind, user_id, guild_id, expires_at, notified_7d, notified_48h = row
-            if expires_at - now <= 7*24*3600 and not notified_7d:
-                await self.send_premium_reminder(kind, user_id, guild_id, expires_at, days=7)
-                await self.db.execute("UPDATE premium SET notified_7d=1 WHERE id=?", (id,))
-            if expires_at - now <= 48*3600 and not notified_48h:
-                await self.send_premium_reminder(kind, user_id, guild_id, expires_at, days=2)
-                await self.db.execute("UPDATE premium SET notified_48h=1 WHERE id=?", (id,))
-            if expires_at <= now:
-                await self.handle_premium_expiry_event(kind, user_id, guild_id)
-                await self.db.execute("DELETE FROM premium WHERE id=?", (id,))
-        await self.db.commit()
+        # Sleeps until the next premium reminder/expiry deadline (see utils.premium_scheduler)
+        await self._ready.wait()
+        await self.premium_scheduler.run()
 
     async def send_premium_reminder(self, kind, user_id, guild_id, expires_at, days):
         # DM user/server owner
@@ -188,42 +250,14 @@ class ElysiumBot(commands.Bot):
                 logger.warning(f"Failed to announce premium expiry in guild {guild}: {e}")
 
     async def world_tick_task(self):
-        # Run world tick every config["tick_interval"]
-        interval = config.get("tick_interval", 60)
-        while not self.is_closed():
-            try:
-                await self._ready.wait()
-                await self.run_world_tick()
-            except Exception as e:
-                logger.error(f"World tick error: {e}")
-            await asyncio.sleep(interval)
-
-    async def run_world_tick(self):
-        # Call the world tick logic in /cogs/world.py
-        cog = self.get_cog("World")
-        if cog:
-            await cog.world_tick()
-        else:
-            logger.warning("World cog not loaded for tick.")
-
-    async def spawn_cleanup_task(self):
-        # Clean up expired spawns
-        interval = config.get("spawn_cleanup_interval", 120)
-        while not self.is_closed():
-            try:
-                await self._ready.wait()
-                await self.cleanup_expired_spawns()
-            except Exception as e:
-                logger.error(f"Spawn cleanup error: {e}")
-            await asyncio.sleep(interval)
-
-    async def cleanup_expired_spawns(self):
-        async with self.db.execute(
-            "DELETE FROM active_spawns WHERE expires_at IS NOT NULL AND expires_at < strftime('%s','now')"
-        ):
-            pass
-        await self.db.commit()
-        logger.info("Expired spawns cleaned up.")
+        # Single world tick driver; phases are registered by the World cog
+        await self._ready.wait()
+        await self.tick_engine.run()
+
+    async def spawn_expiry_task(self):
+        # Expire spawns as their deadlines pass (see utils.spawn_expiry)
+        await self._ready.wait()
+        await self.spawn_expiry.run()
 
 # --- MAIN ---
 
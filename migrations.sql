@@ -1,6 +1,10 @@
 -- Elysium Protocol DB Schema & Migrations
+--
+-- Numbered steps, applied in order by utils.db.run_migrations inside one transaction
+-- each and recorded (with a checksum) in db_version. Never edit a step that has shipped:
+-- add a new "-- migration: <version> <name>" section below instead.
 
-PRAGMA journal_mode = WAL;
+-- migration: 1 initial schema
 
 -- Guilds table
 CREATE TABLE IF NOT EXISTS guilds (
@@ -75,6 +79,13 @@ CREATE TABLE IF NOT EXISTS active_spawns (
     claim_time INTEGER
 );
 
+-- Announcement message of each spawn, retired (edited to "expired") when it expires
+CREATE TABLE IF NOT EXISTS spawn_messages (
+    spawn_id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL
+);
+
 -- World settlements
 CREATE TABLE IF NOT EXISTS settlements (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -188,7 +199,10 @@ CREATE TABLE IF NOT EXISTS settings (
 
 -- DB version for migrations
 CREATE TABLE IF NOT EXISTS db_version (
-    version INTEGER PRIMARY KEY
+    version INTEGER PRIMARY KEY,
+    name TEXT,
+    checksum TEXT,
+    applied_at INTEGER
 );
 
 -- Artifacts master data
@@ -202,11 +216,366 @@ CREATE TABLE IF NOT EXISTS artifact_templates (
     shiny_asset_tag TEXT
 );
 
+-- Lazy settlement accrual: balances in settlements.resources_json are as of settled_at,
+-- and grow by the per-tick rates below until the next read or change settles them.
+CREATE TABLE IF NOT EXISTS settlement_accrual (
+    settlement_id INTEGER PRIMARY KEY,
+    settled_at INTEGER NOT NULL,
+    food_rate INTEGER DEFAULT 5,
+    wood_rate INTEGER DEFAULT 2,
+    stone_rate INTEGER DEFAULT 1
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_settlements_accrual_insert AFTER INSERT ON settlements BEGIN
+    INSERT OR IGNORE INTO settlement_accrual (settlement_id, settled_at) VALUES (NEW.id, strftime('%s','now'));
+END;
+CREATE TRIGGER IF NOT EXISTS trg_settlements_accrual_delete AFTER DELETE ON settlements BEGIN
+    DELETE FROM settlement_accrual WHERE settlement_id = OLD.id;
+END;
+
+-- Settlements created before lazy accrual start accruing from now
+INSERT OR IGNORE INTO settlement_accrual (settlement_id, settled_at)
+    SELECT id, strftime('%s','now') FROM settlements;
+
+-- Rows changed since the last automated backup (filled by the change tracking triggers
+-- of migration 3)
+CREATE TABLE IF NOT EXISTS backup_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    row_id INTEGER NOT NULL
+);
+
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_players_discord_id ON players(discord_id);
 CREATE INDEX IF NOT EXISTS idx_active_spawns_guild_id ON active_spawns(guild_id);
+CREATE INDEX IF NOT EXISTS idx_active_spawns_channel_expires ON active_spawns(channel_id, expires_at);
+CREATE INDEX IF NOT EXISTS idx_active_spawns_expires_at ON active_spawns(expires_at);
+CREATE INDEX IF NOT EXISTS idx_settlements_guild_id ON settlements(guild_id);
 CREATE INDEX IF NOT EXISTS idx_inventory_player_id ON inventory(player_id);
 CREATE INDEX IF NOT EXISTS idx_trades_status ON trades(status);
 CREATE INDEX IF NOT EXISTS idx_battles_status ON battles(status);
+CREATE INDEX IF NOT EXISTS idx_premium_expires_at ON premium(expires_at);
+CREATE INDEX IF NOT EXISTS idx_backup_changes_row ON backup_changes(table_name, row_id);
+
+-- NPC template version (bumped on any change, polled by the in-memory NPC registry)
+CREATE TRIGGER IF NOT EXISTS trg_npcs_version_insert AFTER INSERT ON npcs BEGIN
+    INSERT INTO settings(key, value) VALUES ('npcs_version', '1')
+    ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_npcs_version_update AFTER UPDATE ON npcs BEGIN
+    INSERT INTO settings(key, value) VALUES ('npcs_version', '1')
+    ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_npcs_version_delete AFTER DELETE ON npcs BEGIN
+    INSERT INTO settings(key, value) VALUES ('npcs_version', '1')
+    ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1;
+END;
+
+-- Announcement messages go with their spawn
+CREATE TRIGGER IF NOT EXISTS trg_active_spawns_delete AFTER DELETE ON active_spawns BEGIN
+    DELETE FROM spawn_messages WHERE spawn_id = OLD.id;
+END;
+
+-- migration: 2 hot query indexes
+
+-- battle_log: WHERE challenger_id=? OR opponent_id=? ORDER BY started_at DESC
+CREATE INDEX IF NOT EXISTS idx_battles_challenger_started ON battles(challenger_id, started_at);
+CREATE INDEX IF NOT EXISTS idx_battles_opponent_started ON battles(opponent_id, started_at);
+-- trade_list: WHERE seller_id=? AND status='open' ORDER BY created_at DESC
+CREATE INDEX IF NOT EXISTS idx_trades_seller_status_created ON trades(seller_id, status, created_at);
+-- craft_start artifact count and fusion deletes; covers player_id lookups too
+CREATE INDEX IF NOT EXISTS idx_inventory_player_artifact ON inventory(player_id, artifact_id);
+DROP INDEX IF EXISTS idx_inventory_player_id;
+-- premium_info and revokes
+CREATE INDEX IF NOT EXISTS idx_premium_user_id ON premium(user_id);
+CREATE INDEX IF NOT EXISTS idx_premium_guild_id ON premium(guild_id);
+-- admin logs: ORDER BY created_at DESC LIMIT 20
+CREATE INDEX IF NOT EXISTS idx_logs_created_at ON logs(created_at);
+-- NPC simulation: WHERE status='active'
+CREATE INDEX IF NOT EXISTS idx_world_npcs_status ON world_npcs(status);
+
+-- migration: 3 backup change tracking
+
+-- Record changed rows for incremental backups; keep in step with utils.backup.TRACKED_TABLES
+CREATE TRIGGER IF NOT EXISTS trg_guilds_track_insert AFTER INSERT ON guilds BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'guilds' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('guilds', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_guilds_track_update AFTER UPDATE ON guilds BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'guilds' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('guilds', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_guilds_track_delete AFTER DELETE ON guilds BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'guilds' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('guilds', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_players_track_insert AFTER INSERT ON players BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'players' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('players', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_players_track_update AFTER UPDATE ON players BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'players' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('players', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_players_track_delete AFTER DELETE ON players BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'players' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('players', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_premium_track_insert AFTER INSERT ON premium BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'premium' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('premium', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_premium_track_update AFTER UPDATE ON premium BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'premium' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('premium', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_premium_track_delete AFTER DELETE ON premium BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'premium' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('premium', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_npcs_track_insert AFTER INSERT ON npcs BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'npcs' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('npcs', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_npcs_track_update AFTER UPDATE ON npcs BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'npcs' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('npcs', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_npcs_track_delete AFTER DELETE ON npcs BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'npcs' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('npcs', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_settlements_track_insert AFTER INSERT ON settlements BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'settlements' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('settlements', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_settlements_track_update AFTER UPDATE ON settlements BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'settlements' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('settlements', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_settlements_track_delete AFTER DELETE ON settlements BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'settlements' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('settlements', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_settlement_accrual_track_insert AFTER INSERT ON settlement_accrual BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'settlement_accrual' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('settlement_accrual', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_settlement_accrual_track_update AFTER UPDATE ON settlement_accrual BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'settlement_accrual' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('settlement_accrual', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_settlement_accrual_track_delete AFTER DELETE ON settlement_accrual BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'settlement_accrual' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('settlement_accrual', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_buildings_track_insert AFTER INSERT ON buildings BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'buildings' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('buildings', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_buildings_track_update AFTER UPDATE ON buildings BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'buildings' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('buildings', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_buildings_track_delete AFTER DELETE ON buildings BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'buildings' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('buildings', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_world_npcs_track_insert AFTER INSERT ON world_npcs BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'world_npcs' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('world_npcs', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_world_npcs_track_update AFTER UPDATE ON world_npcs BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'world_npcs' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('world_npcs', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_world_npcs_track_delete AFTER DELETE ON world_npcs BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'world_npcs' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('world_npcs', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_artifacts_track_insert AFTER INSERT ON artifacts BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'artifacts' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('artifacts', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_artifacts_track_update AFTER UPDATE ON artifacts BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'artifacts' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('artifacts', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_artifacts_track_delete AFTER DELETE ON artifacts BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'artifacts' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('artifacts', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_artifact_templates_track_insert AFTER INSERT ON artifact_templates BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'artifact_templates' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('artifact_templates', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_artifact_templates_track_update AFTER UPDATE ON artifact_templates BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'artifact_templates' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('artifact_templates', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_artifact_templates_track_delete AFTER DELETE ON artifact_templates BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'artifact_templates' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('artifact_templates', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_inventory_track_insert AFTER INSERT ON inventory BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'inventory' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('inventory', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_inventory_track_update AFTER UPDATE ON inventory BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'inventory' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('inventory', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_inventory_track_delete AFTER DELETE ON inventory BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'inventory' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('inventory', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_trades_track_insert AFTER INSERT ON trades BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'trades' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('trades', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_trades_track_update AFTER UPDATE ON trades BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'trades' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('trades', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_trades_track_delete AFTER DELETE ON trades BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'trades' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('trades', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_battles_track_insert AFTER INSERT ON battles BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'battles' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('battles', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_battles_track_update AFTER UPDATE ON battles BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'battles' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('battles', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_battles_track_delete AFTER DELETE ON battles BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'battles' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('battles', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_events_track_insert AFTER INSERT ON events BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'events' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('events', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_events_track_update AFTER UPDATE ON events BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'events' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('events', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_events_track_delete AFTER DELETE ON events BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'events' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('events', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_logs_track_insert AFTER INSERT ON logs BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'logs' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('logs', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_logs_track_update AFTER UPDATE ON logs BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'logs' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('logs', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_logs_track_delete AFTER DELETE ON logs BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'logs' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('logs', OLD.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_settings_track_insert AFTER INSERT ON settings BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'settings' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('settings', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_settings_track_update AFTER UPDATE ON settings BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'settings' AND row_id = NEW.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('settings', NEW.rowid);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_settings_track_delete AFTER DELETE ON settings BEGIN
+    DELETE FROM backup_changes WHERE table_name = 'settings' AND row_id = OLD.rowid;
+    INSERT INTO backup_changes (table_name, row_id) VALUES ('settings', OLD.rowid);
+END;
+
+-- migration: 4 battle seed and checkpoints
+
+-- Per-battle RNG seed plus the checkpointed setup and action list (utils.battle_engine)
+ALTER TABLE battles ADD COLUMN seed INTEGER;
+ALTER TABLE battles ADD COLUMN state_json TEXT;
+
+-- migration: 5 battle event store
+
+-- Append-only battle moves, written in batches at battle checkpoints. Not change-tracked
+-- for incremental backups: battles.state_json replays them.
+CREATE TABLE IF NOT EXISTS battle_events (
+    battle_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    actor_id INTEGER,
+    action TEXT NOT NULL, -- a(ttack) / d(efend) / s(pecial)
+    payload TEXT, -- JSON array: [damage, crit, target_hp] for hits
+    PRIMARY KEY (battle_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_battles_status_finished ON battles(status, finished_at);
+
+-- migration: 6 marketplace indexes
+
+-- market_browse: WHERE status='open' [AND item_type=?] AND (price, id) > (?, ?) ORDER BY price, id.
+-- id is the rowid, which every index entry already ends with. Seller listings use
+-- idx_trades_seller_status_created; both make the bare status index redundant.
+CREATE INDEX IF NOT EXISTS idx_trades_status_type_price ON trades(status, item_type, price);
+CREATE INDEX IF NOT EXISTS idx_trades_status_price ON trades(status, price);
+DROP INDEX IF EXISTS idx_trades_status;
+
+-- migration: 7 player counters
+
+-- Per-player counts for limit checks, kept in step with inventory and trades by the
+-- triggers below (utils.counters repairs any drift). player_id is the Discord user id
+-- used by inventory.player_id and trades.seller_id. Derived data: not backed up.
+CREATE TABLE IF NOT EXISTS player_counters (
+    player_id INTEGER PRIMARY KEY,
+    items INTEGER NOT NULL DEFAULT 0, -- inventory rows
+    artifacts INTEGER NOT NULL DEFAULT 0, -- inventory rows holding an artifact (crafting queue limit)
+    open_offers INTEGER NOT NULL DEFAULT 0 -- trades with status 'open'
+);
+INSERT INTO player_counters (player_id, items, artifacts, open_offers)
+SELECT player_id, SUM(items), SUM(artifacts), SUM(open_offers) FROM (
+    SELECT player_id, COUNT(*) AS items, COUNT(artifact_id) AS artifacts, 0 AS open_offers
+    FROM inventory GROUP BY player_id
+    UNION ALL
+    SELECT seller_id, 0, 0, COUNT(*) FROM trades WHERE status = 'open' GROUP BY seller_id
+) GROUP BY player_id;
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_count_insert AFTER INSERT ON inventory BEGIN
+    INSERT INTO player_counters (player_id, items, artifacts) VALUES (NEW.player_id, 1, NEW.artifact_id IS NOT NULL)
+    ON CONFLICT(player_id) DO UPDATE SET items = items + 1, artifacts = artifacts + excluded.artifacts;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_inventory_count_delete AFTER DELETE ON inventory BEGIN
+    UPDATE player_counters SET items = items - 1, artifacts = artifacts - (OLD.artifact_id IS NOT NULL)
+    WHERE player_id = OLD.player_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_inventory_count_update AFTER UPDATE OF player_id, artifact_id ON inventory
+WHEN OLD.player_id != NEW.player_id OR (OLD.artifact_id IS NULL) != (NEW.artifact_id IS NULL) BEGIN
+    UPDATE player_counters SET items = items - 1, artifacts = artifacts - (OLD.artifact_id IS NOT NULL)
+    WHERE player_id = OLD.player_id;
+    INSERT INTO player_counters (player_id, items, artifacts) VALUES (NEW.player_id, 1, NEW.artifact_id IS NOT NULL)
+    ON CONFLICT(player_id) DO UPDATE SET items = items + 1, artifacts = artifacts + excluded.artifacts;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_trades_count_insert AFTER INSERT ON trades WHEN NEW.status = 'open' BEGIN
+    INSERT INTO player_counters (player_id, open_offers) VALUES (NEW.seller_id, 1)
+    ON CONFLICT(player_id) DO UPDATE SET open_offers = open_offers + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_trades_count_delete AFTER DELETE ON trades WHEN OLD.status = 'open' BEGIN
+    UPDATE player_counters SET open_offers = open_offers - 1 WHERE player_id = OLD.seller_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_trades_count_update AFTER UPDATE OF seller_id, status ON trades
+WHEN OLD.seller_id != NEW.seller_id OR (OLD.status IS 'open') != (NEW.status IS 'open') BEGIN
+    UPDATE player_counters SET open_offers = open_offers - 1
+    WHERE player_id = OLD.seller_id AND OLD.status IS 'open';
+    INSERT INTO player_counters (player_id, open_offers) SELECT NEW.seller_id, 1 WHERE NEW.status IS 'open'
+    ON CONFLICT(player_id) DO UPDATE SET open_offers = open_offers + 1;
+END;
+
+-- migration: 8 untrack master data
 
--- Future migrations: add here with new DB version and ALTERs
+-- npcs and artifact_templates are rewritten from data/*.json by utils.master_data at
+-- every startup, so incremental backups need not carry them (full snapshots still do)
+DROP TRIGGER IF EXISTS trg_npcs_track_insert;
+DROP TRIGGER IF EXISTS trg_npcs_track_update;
+DROP TRIGGER IF EXISTS trg_npcs_track_delete;
+DROP TRIGGER IF EXISTS trg_artifact_templates_track_insert;
+DROP TRIGGER IF EXISTS trg_artifact_templates_track_update;
+DROP TRIGGER IF EXISTS trg_artifact_templates_track_delete;
+DELETE FROM backup_changes WHERE table_name IN ('npcs', 'artifact_templates');
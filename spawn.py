@@ -1,87 +1,82 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord import app_commands
 import random
 import asyncio
-import json
 from utils.db import db_ctx
-from utils.embeds import make_spawn_embed
-from utils.security import claim_rate_limit, anti_snipe_check
+from utils.spawn_scheduler import SpawnScheduler
+from utils.claim_arbiter import ClaimArbiter, WON, LOST, TOO_FAST, DUPLICATE
+from utils.security import claim_rate_limit
 from datetime import datetime
 
 class Spawn(commands.Cog, name="Spawn"):
     def __init__(self, bot):
         self.bot = bot
         self.config = bot.config
-        self.spawn_task.start()
-
-    def cog_unload(self):
-        self.spawn_task.cancel()
-
-    @tasks.loop(seconds=30)
-    async def spawn_task(self):
-        for guild in self.bot.guilds:
-            try:
-                await self.try_spawn(guild)
-            except Exception as e:
-                print(f"Spawn error in guild {guild.id}: {e}")
+        scheduler_cfg = self.config.get("spawn_scheduler", {})
+        self.scheduler = SpawnScheduler(
+            bot,
+            period=scheduler_cfg.get("period_seconds", 30),
+            buckets=scheduler_cfg.get("buckets", 10),
+            max_concurrent_sends=scheduler_cfg.get("max_concurrent_sends", 8)
+        )
+        claim_cfg = self.config["claim"]
+        self.arbiter = ClaimArbiter(
+            bot,
+            window=claim_cfg["anti_snipe_window"],
+            min_typing_delay=claim_cfg["min_typing_delay"],
+            seed=claim_cfg.get("arbitration_seed")
+        )
+        self.spawn_task = None
 
-    async def try_spawn(self, guild):
-        async with db_ctx(self.bot.db) as db:
-            chan_id = self.config.get("default_announce_channel") or getattr(guild, "system_channel", None)
-            channel = guild.get_channel(chan_id) if chan_id else guild.system_channel
-            if not channel:
-                return
-            rate = self.config["spawn_rates"]["base"]
-            if random.random() > rate:
-                return
-            npc_templates = await self.get_random_npcs(db)
-            expires_at = int(datetime.utcnow().timestamp()) + 60
-            npc_ids = [npc["id"] for npc in npc_templates]
-            await db.execute(
-                "INSERT INTO active_spawns (guild_id, channel_id, npc_ids, spawn_type, expires_at) VALUES (?, ?, ?, ?, ?)",
-                (guild.id, channel.id, json.dumps(npc_ids), "spawn", expires_at)
-            )
-            await db.commit()
-            embed = make_spawn_embed(npc_templates, expires_at)
-            await channel.send(embed=embed)
+    async def cog_load(self):
+        self.spawn_task = asyncio.create_task(self.scheduler.run())
 
-    async def get_random_npcs(self, db):
-        weights = self.config["rarity_weights"]
-        async with db.execute("SELECT * FROM npcs") as cursor:
-            npcs = [dict(zip([column[0] for column in cursor.description], row)) async for row in cursor]
-        population = [npc for npc in npcs if npc["category"] == "spawn"]
-        choices = random.choices(
-            population,
-            weights=[weights.get(npc["rarity"], 1) for npc in population],
-            k=random.randint(1, 3)
-        )
-        return choices
+    def cog_unload(self):
+        if self.spawn_task:
+            self.spawn_task.cancel()
 
     @app_commands.command(name="claim", description="Type to claim a spawn slot (fairness enforced).")
     @claim_rate_limit()
     async def claim(self, interaction: discord.Interaction, slot: int):
         user = interaction.user
-        async with db_ctx(self.bot.db) as db:
-            async with db.execute(
-                "SELECT * FROM active_spawns WHERE channel_id=? AND expires_at > strftime('%s','now') AND claimed_by IS NULL",
-                (interaction.channel.id,)
-            ) as cursor:
-                spawn_row = await cursor.fetchone()
-            if not spawn_row:
-                await interaction.response.send_message("No active spawn to claim.", ephemeral=True)
-                return
-            if not anti_snipe_check(user.id, spawn_row):
-                await interaction.response.send_message("Claim failed: fairness rule triggered.", ephemeral=True)
-                return
-            await db.execute(
-                "UPDATE active_spawns SET claimed_by=?, claim_slot=?, claim_time=? WHERE id=?",
-                (user.id, slot, int(datetime.utcnow().timestamp()), spawn_row[0])
-            )
-            await db.commit()
-            await interaction.response.send_message(
-                f"{user.mention} claimed slot {slot}!", ephemeral=False
-            )
+        now = int(datetime.utcnow().timestamp())
+        spawn = self.bot.spawn_registry.current(interaction.channel.id, now)
+        if not spawn:
+            await interaction.response.send_message("No active spawn to claim.", ephemeral=True)
+            return
+        if not 1 <= slot <= len(spawn.npc_ids):
+            await interaction.response.send_message(f"Pick a slot between 1 and {len(spawn.npc_ids)}.", ephemeral=True)
+            return
+        # Claims are pooled for the anti-snipe window and settled together
+        await interaction.response.defer(ephemeral=True)
+        result = await self.arbiter.submit(spawn, user.id, slot, interaction.created_at.timestamp())
+        if result.status == DUPLICATE:
+            await interaction.followup.send("You already have a claim in for this spawn.", ephemeral=True)
+        elif result.status == TOO_FAST:
+            await interaction.followup.send("Too fast! Claims sent right after a spawn appears don't count.", ephemeral=True)
+        elif result.status == LOST:
+            await interaction.followup.send(f"Not this time: <@{result.winner_id}> won the spawn.", ephemeral=True)
+        elif result.status == WON:
+            await interaction.followup.send(f"You won slot {result.slot}!", ephemeral=True)
+            msg = f"{user.mention} claimed slot {result.slot}!"
+            if await self.roll_shiny(user.id, interaction.guild.id, spawn.npc_ids[result.slot - 1]):
+                msg += f" {self.config['shiny']['shiny_frame']} It's shiny!"
+            await interaction.channel.send(msg)
+        else:
+            await interaction.followup.send("Too late, this spawn is no longer available.", ephemeral=True)
+
+    async def roll_shiny(self, user_id, guild_id, npc_id):
+        # A shiny is only announced once it is saved on the player's profile
+        perks = self.bot.entitlements.perks(user_id, guild_id)
+        if random.random() >= perks.shiny_odds:
+            return False
+        npc = self.bot.npc_registry.get(npc_id)
+        _, saved = await self.bot.db.commit_write(
+            "UPDATE players SET shiny_unlocked=1, shiny_variant_tag=? WHERE discord_id=?",
+            (npc["shiny_asset_tag"] if npc else None, user_id)
+        )
+        return bool(saved)
 
     @app_commands.command(name="spawn_setchannel", description="Set the spawn channel for this server.")
     @commands.has_permissions(administrator=True)
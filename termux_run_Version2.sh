@@ -9,10 +9,10 @@ source venv/bin/activate
 
 # Upgrade pip & install requirements
 pip install --upgrade pip
-pip install discord.py aiosqlite aiohttp typing-extensions
+pip install discord.py aiosqlite aiohttp typing-extensions numpy
 
-# Run migrations
-python3 -c "import asyncio; import utils.db as db; asyncio.run(db.run_migrations())"
+# Precompile once so each restart skips bytecode compilation (migrations run at bot startup)
+python3 -m compileall -q .
 
 # Run bot
 python3 elysium.py
\ No newline at end of file
@@ -0,0 +1,456 @@
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from utils.counters import RECOUNT_SQL
+
+BACKUP_TABLES = (
+    "guilds", "players", "settlements", "settlement_accrual", "buildings", "inventory",
+    "artifacts", "active_spawns", "trades", "battles", "battle_events", "events", "logs",
+)
+COPY_CHUNK = 1024 * 1024
+COMPRESS_LEVEL = 6
+
+class BackupReport:
+    __slots__ = ("path", "bytes", "rows", "duration")
+
+    def __init__(self, path, size, rows, duration):
+        self.path = path
+        self.bytes = size
+        self.rows = rows
+        self.duration = duration
+
+    @property
+    def throughput(self):
+        # MB/s of output written
+        return self.bytes / (1024 * 1024) / self.duration if self.duration else 0.0
+
+    def summary(self):
+        rows = f"{self.rows} rows • " if self.rows is not None else ""
+        return f"{rows}{self.bytes / (1024 * 1024):.2f} MB in {self.duration:.2f}s ({self.throughput:.2f} MB/s)"
+
+def backup_name(prefix, suffix, now=None):
+    return f"{prefix}-{(now or datetime.utcnow()).strftime('%Y%m%d-%H%M%S')}{suffix}"
+
+def snapshot_sync(db_path, dest_path):
+    # One-step online backup: a single read transaction on the WAL, so the copy is
+    # consistent and writers carry on meanwhile
+    src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    dst = sqlite3.connect(dest_path)
+    try:
+        src.backup(dst)
+        # Self-contained file: no -wal/-shm side files next to the snapshot
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+
+def compress_file_sync(path, dest_path):
+    with open(path, "rb") as src, gzip.open(dest_path, "wb", compresslevel=COMPRESS_LEVEL) as dst:
+        shutil.copyfileobj(src, dst, COPY_CHUNK)
+
+def write_ndjson_sync(snapshot_path, dest_path, tables=BACKUP_TABLES, chunk_rows=1000, compress=True):
+    # One header line per table ({"table", "columns"}) followed by one JSON array per
+    # row, fetched `chunk_rows` at a time so memory stays flat
+    out = gzip.open(dest_path, "wt", encoding="utf-8", compresslevel=COMPRESS_LEVEL) if compress else open(dest_path, "w", encoding="utf-8")
+    rows_written = 0
+    con = sqlite3.connect(f"file:{snapshot_path}?mode=ro", uri=True)
+    try:
+        with out:
+            for table in tables:
+                cursor = con.execute(f"SELECT * FROM {table}")
+                columns = [col[0] for col in cursor.description]
+                out.write(json.dumps({"table": table, "columns": columns}) + "\n")
+                while True:
+                    rows = cursor.fetchmany(chunk_rows)
+                    if not rows:
+                        break
+                    out.write("".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows))
+                    rows_written += len(rows)
+    finally:
+        con.close()
+    return rows_written
+
+def export_backup_sync(db_path, out_dir, fmt="ndjson", compress=True, chunk_rows=1000):
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.monotonic()
+    snapshot_path = os.path.join(out_dir, backup_name("snapshot", ".db"))
+    snapshot_sync(db_path, snapshot_path)
+    rows = None
+    if fmt == "ndjson":
+        path = os.path.join(out_dir, backup_name("backup", ".ndjson.gz" if compress else ".ndjson"))
+        rows = write_ndjson_sync(snapshot_path, path, chunk_rows=chunk_rows, compress=compress)
+        os.remove(snapshot_path)
+    elif compress:
+        path = snapshot_path + ".gz"
+        compress_file_sync(snapshot_path, path)
+        os.remove(snapshot_path)
+    else:
+        path = snapshot_path
+    return BackupReport(path, os.path.getsize(path), rows, time.monotonic() - start)
+
+async def export_backup(db_path, out_dir, fmt="ndjson", compress=True, chunk_rows=1000):
+    # Runs in a worker thread on its own sqlite3 connections; the bot's pool is untouched
+    return await asyncio.to_thread(export_backup_sync, db_path, out_dir, fmt, compress, chunk_rows)
+
+class ImportProgress:
+    # Updated by the import thread, polled by whoever wants to show progress
+    __slots__ = ("table", "rows", "tables", "done")
+
+    def __init__(self):
+        self.table = None
+        self.rows = 0
+        self.tables = 0
+        self.done = False
+
+    def summary(self):
+        return f"{self.tables} table(s), {self.rows} rows" + (f" (loading `{self.table}`)" if self.table and not self.done else "")
+
+def open_backup(path):
+    with open(path, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    return gzip.open(path, "rt", encoding="utf-8") if gzipped else open(path, "r", encoding="utf-8")
+
+def live_columns(con, table):
+    return [row[1] for row in con.execute(f"PRAGMA table_info({table})")]
+
+def import_backup_sync(db_path, path, batch_rows=5000, progress=None, busy_timeout=30):
+    # Loads an NDJSON backup (see write_ndjson_sync) in one transaction. Each table in
+    # the file is validated against the live schema, emptied and refilled with batched
+    # executemany; its indexes and triggers are dropped for the load and recreated before
+    # COMMIT, what the triggers would have maintained is rebuilt in one pass each, and
+    # foreign keys are checked once at the end. Any error rolls everything back.
+    progress = progress or ImportProgress()
+    start = time.monotonic()
+    con = sqlite3.connect(db_path, isolation_level=None, timeout=busy_timeout)
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.execute("PRAGMA defer_foreign_keys=ON")
+            indexes = []
+            triggers = []
+            seen = set()
+            insert = None
+            width = 0
+            batch = []
+            with open_backup(path) as f:
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    if isinstance(item, list):
+                        if insert is None or len(item) != width:
+                            raise ValueError(f"Line {line_no}: row does not match a table header")
+                        batch.append(item)
+                        if len(batch) >= batch_rows:
+                            con.executemany(insert, batch)
+                            progress.rows += len(batch)
+                            batch = []
+                        continue
+                    if batch:
+                        con.executemany(insert, batch)
+                        progress.rows += len(batch)
+                        batch = []
+                    table = item.get("table")
+                    columns = item.get("columns") or []
+                    # Names are only ever taken from the live schema, never from the file
+                    if table not in BACKUP_TABLES or table in seen:
+                        raise ValueError(f"Line {line_no}: unknown or repeated table {table!r}")
+                    known = live_columns(con, table)
+                    unknown = [col for col in columns if col not in known]
+                    if not columns or unknown:
+                        raise ValueError(f"Line {line_no}: {table} has unknown columns {unknown}")
+                    columns = [known[known.index(col)] for col in columns]
+                    seen.add(table)
+                    if progress.table is not None:
+                        progress.tables += 1
+                    progress.table = table
+                    for kind, name, sql in con.execute(
+                        "SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name=? AND sql IS NOT NULL",
+                        (table,)
+                    ).fetchall():
+                        (indexes if kind == "index" else triggers).append(sql)
+                        con.execute(f'DROP {kind.upper()} "{name}"')
+                    con.execute(f"DELETE FROM {table}")
+                    insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+                    width = len(columns)
+            if batch:
+                con.executemany(insert, batch)
+                progress.rows += len(batch)
+            if progress.table is not None:
+                progress.tables += 1
+            for sql in indexes + triggers:
+                con.execute(sql)
+            # Settlements restored without accrual rows start accruing from now
+            con.execute(
+                "INSERT OR IGNORE INTO settlement_accrual (settlement_id, settled_at) SELECT id, strftime('%s','now') FROM settlements"
+            )
+            con.execute("DELETE FROM settlement_accrual WHERE settlement_id NOT IN (SELECT id FROM settlements)")
+            con.execute("DELETE FROM spawn_messages WHERE spawn_id NOT IN (SELECT id FROM active_spawns)")
+            recount_counters(con)
+            # Nothing was tracked during the load, so the next automated backup must be a
+            # full one (see BackupService.run_sync)
+            con.execute("INSERT OR REPLACE INTO settings(key, value) VALUES (?, strftime('%s','now'))", (FULL_BACKUP_DUE,))
+            con.execute("DELETE FROM backup_changes")
+            if con.execute("PRAGMA foreign_key_check").fetchone():
+                raise ValueError("Backup violates foreign key constraints")
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+    finally:
+        con.close()
+        progress.done = True
+    return BackupReport(path, os.path.getsize(path), progress.rows, time.monotonic() - start)
+
+async def import_backup(db_path, path, batch_rows=5000, progress=None):
+    return await asyncio.to_thread(import_backup_sync, db_path, path, batch_rows, progress)
+
+# --- Automated full + incremental backups ---
+
+# Tables whose changes are recorded in backup_changes (triggers in migration 3); spawns
+# and their messages are short-lived and left to the next full snapshot, and master data
+# is reloaded from data/ at startup (migration 8)
+TRACKED_TABLES = (
+    "guilds", "players", "premium", "settlements", "settlement_accrual", "buildings",
+    "world_npcs", "artifacts", "inventory", "trades", "battles", "events", "logs", "settings",
+)
+# Tracked before migration 8; still replayed from incrementals written back then
+UNTRACKED_TABLES = ("npcs", "artifact_templates")
+MANIFEST = "manifest.json"
+# settings key set by import_backup_sync: the backup chain no longer matches the data
+FULL_BACKUP_DUE = "backup_full_due"
+
+def load_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(directory, entries):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def forget_changes(db_path, seq, busy_timeout=30, full_due=None):
+    # Everything up to seq is in a backup now; later changes keep their newer seq.
+    # full_due is the FULL_BACKUP_DUE value a full snapshot saw, cleared unless an
+    # import has set a newer one since.
+    con = sqlite3.connect(db_path, timeout=busy_timeout)
+    try:
+        con.execute("DELETE FROM backup_changes WHERE seq <= ?", (seq,))
+        if full_due is not None:
+            con.execute("DELETE FROM settings WHERE key = ? AND value = ?", (FULL_BACKUP_DUE, full_due))
+        con.commit()
+    finally:
+        con.close()
+
+def full_backup_due(db_path):
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return con.execute("SELECT 1 FROM settings WHERE key = ?", (FULL_BACKUP_DUE,)).fetchone() is not None
+    finally:
+        con.close()
+
+def full_backup_sync(db_path, directory, now=None):
+    now = now or datetime.utcnow()
+    name = backup_name("full", ".db", now)
+    tmp_path = os.path.join(directory, name)
+    src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, isolation_level=None)
+    dst = sqlite3.connect(tmp_path)
+    try:
+        # seq and snapshot come from the same read transaction
+        src.execute("BEGIN")
+        seq = src.execute("SELECT COALESCE(MAX(seq), 0) FROM backup_changes").fetchone()[0]
+        due = src.execute("SELECT value FROM settings WHERE key = ?", (FULL_BACKUP_DUE,)).fetchone()
+        src.backup(dst)
+        src.execute("COMMIT")
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+    compress_file_sync(tmp_path, tmp_path + ".gz")
+    os.remove(tmp_path)
+    forget_changes(db_path, seq, full_due=due[0] if due else None)
+    return {"kind": "full", "file": name + ".gz", "seq": seq, "created_at": now.timestamp()}
+
+def incremental_backup_sync(db_path, directory, since_seq, chunk_rows=1000, now=None):
+    # Current values of every row changed after since_seq, one table at a time:
+    # ["u", [rowid, *columns]] for rows that exist, ["d", rowid] for deleted ones.
+    # Returns None when nothing changed.
+    now = now or datetime.utcnow()
+    name = backup_name("incr", ".ndjson.gz", now)
+    path = os.path.join(directory, name)
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, isolation_level=None)
+    try:
+        con.execute("BEGIN")
+        seq = con.execute("SELECT COALESCE(MAX(seq), 0) FROM backup_changes").fetchone()[0]
+        if seq <= since_seq:
+            return None
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=COMPRESS_LEVEL) as out:
+            for table in TRACKED_TABLES:
+                cursor = con.execute(
+                    f"SELECT c.row_id, t.rowid, t.* FROM backup_changes c LEFT JOIN {table} t ON t.rowid = c.row_id "
+                    "WHERE c.table_name = ? AND c.seq > ? AND c.seq <= ? ORDER BY c.seq",
+                    (table, since_seq, seq)
+                )
+                columns = [col[0] for col in cursor.description[2:]]
+                header = False
+                while True:
+                    rows = cursor.fetchmany(chunk_rows)
+                    if not rows:
+                        break
+                    if not header:
+                        out.write(json.dumps({"table": table, "columns": columns}) + "\n")
+                        header = True
+                    out.write("".join(
+                        json.dumps(["u", list(row[1:])] if row[1] is not None else ["d", row[0]], separators=(",", ":")) + "\n"
+                        for row in rows
+                    ))
+        con.execute("COMMIT")
+    finally:
+        con.close()
+    forget_changes(db_path, seq)
+    return {"kind": "incremental", "file": name, "seq": seq, "since": since_seq, "created_at": now.timestamp()}
+
+def prune_backups(directory, entries, retention_days, now=None):
+    # Keeps every point newer than the cutoff plus the full backup (and its
+    # incrementals) that the oldest retained point is built on
+    cutoff = (now or datetime.utcnow()).timestamp() - retention_days * 86400
+    base = 0
+    for i, entry in enumerate(entries):
+        if entry["kind"] == "full" and entry["created_at"] <= cutoff:
+            base = i
+    for entry in entries[:base]:
+        path = os.path.join(directory, entry["file"])
+        if os.path.exists(path):
+            os.remove(path)
+    return entries[base:]
+
+def apply_incremental(con, path):
+    insert = None
+    with open_backup(path) as f:
+        for line in f:
+            item = json.loads(line)
+            if isinstance(item, dict):
+                table = item["table"]
+                if table not in TRACKED_TABLES + UNTRACKED_TABLES:
+                    raise ValueError(f"Unknown table {table!r} in {path}")
+                known = live_columns(con, table)
+                columns = [known[known.index(col)] for col in item["columns"]]
+                insert = f"INSERT OR REPLACE INTO {table} (rowid, {', '.join(columns)}) VALUES (?, {', '.join('?' for _ in columns)})"
+                delete = f"DELETE FROM {table} WHERE rowid = ?"
+            elif item[0] == "u":
+                con.execute(insert, item[1])
+            else:
+                con.execute(delete, (item[1],))
+
+def recount_counters(con):
+    # INSERT OR REPLACE does not fire delete triggers, so replayed rows leave
+    # player_counters inflated; rebuild it from the restored rows. Snapshots taken before
+    # migration 7 have no counters yet and get them backfilled when it runs.
+    if con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='player_counters'").fetchone():
+        con.execute("DELETE FROM player_counters")
+        con.execute("INSERT INTO player_counters (player_id, items, artifacts, open_offers) " + RECOUNT_SQL)
+
+def restore_sync(directory, db_path, at=None):
+    # Rebuilds db_path as of the latest retained point at or before `at` (epoch seconds)
+    entries = [entry for entry in load_manifest(directory) if at is None or entry["created_at"] <= at]
+    fulls = [i for i, entry in enumerate(entries) if entry["kind"] == "full"]
+    if not fulls:
+        raise ValueError("No full backup at or before that point")
+    chain = entries[fulls[-1]:]
+    tmp_path = db_path + ".restore"
+    with gzip.open(os.path.join(directory, chain[0]["file"]), "rb") as src, open(tmp_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, COPY_CHUNK)
+    con = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        con.execute("BEGIN")
+        for entry in chain[1:]:
+            apply_incremental(con, os.path.join(directory, entry["file"]))
+        if chain[1:]:
+            recount_counters(con)
+        # The restored file starts a fresh chain with its next full backup
+        con.execute("DELETE FROM backup_changes")
+        con.execute("COMMIT")
+    finally:
+        con.close()
+    os.replace(tmp_path, db_path)
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    return chain[-1]
+
+class BackupService:
+    # Full snapshot every `full_interval_hours`, an incremental delta of the rows changed
+    # since the previous backup otherwise, pruned to `retention_days`. All file and
+    # SQLite work runs in a worker thread on separate connections; run_due() returns
+    # immediately if a backup is already in progress.
+
+    def __init__(self, db_path, directory, full_interval_hours=24, retention_days=14, chunk_rows=1000):
+        self.db_path = db_path
+        self.directory = directory
+        self.full_interval = full_interval_hours * 3600
+        self.retention_days = retention_days
+        self.chunk_rows = chunk_rows
+        self.running = False
+        self.last = None
+
+    def due_kind(self, entries, now):
+        fulls = [entry for entry in entries if entry["kind"] == "full"]
+        if not fulls or now - fulls[-1]["created_at"] >= self.full_interval:
+            return "full"
+        return "incremental"
+
+    def run_sync(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries = load_manifest(self.directory)
+        now = datetime.utcnow()
+        start = time.monotonic()
+        if self.due_kind(entries, now.timestamp()) == "full" or full_backup_due(self.db_path):
+            entry = full_backup_sync(self.db_path, self.directory, now)
+        else:
+            entry = incremental_backup_sync(self.db_path, self.directory, entries[-1]["seq"], self.chunk_rows, now)
+        if entry is None:
+            return None
+        entry["duration"] = round(time.monotonic() - start, 3)
+        entries = prune_backups(self.directory, entries + [entry], self.retention_days, now)
+        save_manifest(self.directory, entries)
+        return entry
+
+    async def run_due(self):
+        if self.running:
+            return None
+        self.running = True
+        try:
+            entry = await asyncio.to_thread(self.run_sync)
+        finally:
+            self.running = False
+        if entry is not None:
+            self.last = entry
+        return entry
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Restore the Elysium database from automated backups.")
+    parser.add_argument("directory", help="backup directory containing manifest.json")
+    parser.add_argument("--db", default="elysium.db", help="database file to rebuild (stop the bot first)")
+    parser.add_argument("--at", help="restore point, UTC 'YYYY-MM-DD HH:MM[:SS]' (default: latest)")
+    parser.add_argument("--list", action="store_true", help="list retained restore points")
+    args = parser.parse_args(argv)
+    if args.list:
+        for entry in load_manifest(args.directory):
+            print(f"{datetime.fromtimestamp(entry['created_at']):%Y-%m-%d %H:%M:%S}  {entry['kind']:<11}  {entry['file']}")
+        return
+    at = datetime.fromisoformat(args.at).timestamp() if args.at else None
+    entry = restore_sync(args.directory, args.db, at)
+    print(f"Restored {args.db} to {datetime.fromtimestamp(entry['created_at']):%Y-%m-%d %H:%M:%S} ({entry['file']})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+import json
+import random
+import time
+
+ATTACK = "attack"
+DEFEND = "defend"
+SPECIAL = "special"
+ACTIONS = (ATTACK, DEFEND, SPECIAL)
+# One-letter codes used in battle_events.action and in the compact replay string
+CODES = {ATTACK: "a", DEFEND: "d", SPECIAL: "s"}
+ACTION_OF = {code: action for action, code in CODES.items()}
+
+class Combatant:
+    __slots__ = (
+        "id", "name", "is_npc", "hp", "max_hp", "atk", "defense", "special_name", "special_cooldown", "cooldown", "defending",
+    )
+
+    def __init__(
+        self, combatant_id, name, is_npc, hp, atk, defense, special_name="Special", special_cooldown=None,
+        cooldown=0, defending=False, max_hp=None
+    ):
+        self.id = combatant_id
+        self.name = name
+        self.is_npc = is_npc
+        self.hp = hp
+        self.max_hp = max_hp if max_hp is not None else hp
+        self.atk = atk
+        self.defense = defense
+        self.special_name = special_name
+        # Turns the special needs to recharge; None takes the battle's default
+        self.special_cooldown = special_cooldown
+        self.cooldown = cooldown
+        self.defending = defending
+
+    def setup(self):
+        # Starting values only: everything else is rebuilt by replaying the actions
+        return {
+            "combatant_id": self.id, "name": self.name, "is_npc": self.is_npc, "hp": self.max_hp,
+            "atk": self.atk, "defense": self.defense, "special_name": self.special_name,
+            "special_cooldown": self.special_cooldown,
+        }
+
+def player_combatant(user_id, name, level, config):
+    battle = config["battle"]
+    base = battle["player_base"]
+    growth = battle["player_per_level"]
+    steps = max(0, (level or 1) - 1)
+    return Combatant(
+        user_id, name, False,
+        base["hp"] + growth["hp"] * steps,
+        base["atk"] + growth["atk"] * steps,
+        base["def"] + growth["def"] * steps,
+    )
+
+def npc_combatant(npc, stats, abilities, config):
+    # abilities_json may set the special's recharge in turns ("cooldown"); NPCs without
+    # one use the battle default
+    scale = config["battle"].get("boss_hp_multiplier", 1) if npc["category"] in ("raid", "boss") else 1
+    cooldown = abilities.get("cooldown")
+    return Combatant(
+        npc["id"], npc["name"], True,
+        int(stats.get("hp", 30) * scale), stats.get("atk", 8), stats.get("def", 5),
+        abilities.get("special") or abilities.get("basic") or "Special",
+        int(cooldown) if cooldown is not None else None,
+    )
+
+class BattleEvent:
+    # One resolved move. payload is [damage, crit, target_hp] for hits and [] for defend.
+    __slots__ = ("seq", "actor_id", "code", "payload")
+
+    def __init__(self, seq, actor_id, code, payload):
+        self.seq = seq
+        self.actor_id = actor_id
+        self.code = code
+        self.payload = payload
+
+def describe_event(names, event, special_names=None):
+    # names: combatant id -> display name, in turn order (challenger first)
+    actor = names.get(event.actor_id, str(event.actor_id))
+    target = next((name for cid, name in names.items() if cid != event.actor_id), "?")
+    if event.code == "d":
+        return f"{actor} braces for the next hit."
+    damage, crit, target_hp = event.payload
+    label = (special_names or {}).get(event.actor_id, "Special") if event.code == "s" else "Attack"
+    line = f"{actor} used {label} on {target} for {damage}{' (crit!)' if crit else ''}. {target}: {target_hp} HP"
+    if target_hp == 0:
+        line += f" — {actor} wins!"
+    return line
+
+class BattleState:
+    # One battle in memory. All randomness comes from a private random.Random(seed), so
+    # the seed, the starting combatants and the player action codes replay it exactly
+    # (whose turn it is follows from the order, so actors need not be stored).
+
+    def __init__(self, battle_id, kind, seed, combatants, special_cooldown=3):
+        self.id = battle_id
+        self.kind = kind
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.combatants = combatants
+        for c in combatants:
+            if c.special_cooldown is None:
+                c.special_cooldown = special_cooldown
+        self.setup = [c.setup() for c in combatants]
+        self.names = {c.id: c.name for c in combatants}
+        self.special_names = {c.id: c.special_name for c in combatants}
+        self.special_cooldown = special_cooldown
+        self.turn = 0
+        self.actions = []
+        self.events = 0
+        self.status = "active"
+        self.winner = None
+        self.saved_actions = 0
+        self.pending_events = []
+        # Monotonic time of the last lookup or action, for idle eviction
+        self.touched_at = time.monotonic()
+
+    @classmethod
+    def replay(cls, battle_id, kind, seed, setup, actions, special_cooldown=3, keep_events=False):
+        # actions: compact code string, or [actor_id, action] pairs from older checkpoints
+        state = cls(battle_id, kind, seed, [Combatant(**c) for c in setup], special_cooldown)
+        for item in actions:
+            action = ACTION_OF[item] if isinstance(item, str) else item[1]
+            state.apply(state.current().id, action)
+        state.saved_actions = len(state.actions)
+        if not keep_events:
+            state.pending_events = []
+        return state
+
+    def current(self):
+        return self.combatants[self.turn % 2]
+
+    def other(self, combatant):
+        return self.combatants[1] if combatant is self.combatants[0] else self.combatants[0]
+
+    def check(self, actor_id, action):
+        # Reason the action is not allowed right now, or None
+        if self.status != "active":
+            return "Battle is not active."
+        if action not in ACTIONS:
+            return "Unknown action."
+        actor = self.current()
+        if actor.is_npc or actor.id != actor_id:
+            return "It's not your turn."
+        if action == SPECIAL and actor.cooldown:
+            return f"{actor.special_name} is recharging ({actor.cooldown} turn(s) left)."
+        return None
+
+    def apply(self, actor_id, action):
+        # Applies the action of the combatant whose turn it is, then lets an NPC opponent
+        # respond. Returns the events produced.
+        events = [self._act(self.current(), action)]
+        while self.status == "active" and self.current().is_npc:
+            npc = self.current()
+            events.append(self._act(npc, SPECIAL if not npc.cooldown else ATTACK))
+        self.actions.append(CODES[action])
+        self.pending_events.extend(events)
+        return events
+
+    def describe(self, event):
+        return describe_event(self.names, event, self.special_names)
+
+    def _act(self, actor, action):
+        target = self.other(actor)
+        if actor.cooldown:
+            actor.cooldown -= 1
+        actor.defending = False
+        self.turn += 1
+        self.events += 1
+        if action == DEFEND:
+            actor.defending = True
+            return BattleEvent(self.events, actor.id, "d", [])
+        if action == SPECIAL:
+            actor.cooldown = actor.special_cooldown
+            damage = actor.atk * 2
+        else:
+            damage = max(1, actor.atk - target.defense // 2)
+        damage = max(1, round(damage * self.rng.uniform(0.85, 1.15)))
+        crit = self.rng.random() < 0.1
+        if crit:
+            damage = round(damage * 1.5)
+        if target.defending:
+            damage = max(1, damage // 2)
+            target.defending = False
+        target.hp = max(0, target.hp - damage)
+        if target.hp == 0:
+            self.status = "finished"
+            self.winner = actor.id
+        return BattleEvent(self.events, actor.id, CODES[action], [damage, int(crit), target.hp])
+
+    def snapshot(self):
+        return json.dumps(
+            {"setup": self.setup, "actions": "".join(self.actions), "cooldown": self.special_cooldown, "events": self.events},
+            separators=(",", ":")
+        )
+
+class Checkpoint:
+    # Statements saving one battle, plus how far they got (actions and buffered events),
+    # applied to the in-memory state by BattleEngine.saved() once they have committed
+    __slots__ = ("state", "actions", "events", "statements")
+
+    def __init__(self, state, actions, events, statements):
+        self.state = state
+        self.actions = actions
+        self.events = events
+        self.statements = statements
+
+class BattleEngine:
+    # Active battles kept in memory. Their events are appended to battle_events and the
+    # replay checkpoint rewritten only every `checkpoint_every` actions and when a battle
+    # finishes. Battles idle for `idle_seconds` are checkpointed and dropped. A battle
+    # missing from memory (e.g. after a restart or eviction) is rebuilt by replaying its
+    # last checkpoint. Memory only moves on after a checkpoint has committed, so a failed
+    # write is simply retried by the next one.
+
+    def __init__(self, config):
+        battle = config["battle"]
+        self.config = config
+        self.checkpoint_every = battle.get("checkpoint_every", 5)
+        self.special_cooldown = battle.get("special_cooldown", 3)
+        self.idle_seconds = battle.get("idle_evict_minutes", 30) * 60
+        self.active = {}
+
+    def start(self, battle_id, kind, seed, combatants):
+        state = BattleState(battle_id, kind, seed, combatants, self.special_cooldown)
+        if battle_id is not None:
+            self.active[battle_id] = state
+        return state
+
+    def track(self, battle_id, state):
+        # For states built before their row (and id) existed
+        state.id = battle_id
+        self.active[battle_id] = state
+
+    def get(self, battle_id):
+        state = self.active.get(battle_id)
+        if state is not None:
+            state.touched_at = time.monotonic()
+        return state
+
+    def idle(self, state, clock):
+        return clock - state.touched_at >= self.idle_seconds
+
+    def evict_idle(self, now, clock=None):
+        # Battles untouched for idle_seconds leave memory and are restored from their
+        # checkpoint if anyone acts on them again. Those with unsaved actions stay until
+        # the returned checkpoints commit and are passed to saved(..., evict=True).
+        clock = clock or time.monotonic()
+        checkpoints = []
+        for state in [s for s in self.active.values() if self.idle(s, clock)]:
+            if state.pending_events or len(state.actions) != state.saved_actions:
+                checkpoints.append(self.checkpoint(state, now))
+            else:
+                self.active.pop(state.id, None)
+        return checkpoints
+
+    def reset(self):
+        # Forget every in-memory battle (e.g. after a backup import); they are restored
+        # from their rows on the next action
+        self.active = {}
+
+    def restore(self, battle):
+        # battle is a BattleRow; returns None for rows without a checkpoint
+        if battle.status != "active" or battle.seed is None or not battle.state_json:
+            return None
+        state = self.replay(battle)
+        self.active[battle.id] = state
+        return state
+
+    def replay(self, battle, keep_events=False):
+        saved = json.loads(battle.state_json)
+        return BattleState.replay(
+            battle.id, battle.type, battle.seed, saved["setup"], saved["actions"],
+            saved.get("cooldown", self.special_cooldown), keep_events
+        )
+
+    def checkpoint_due(self, state):
+        return state.status != "active" or len(state.actions) - state.saved_actions >= self.checkpoint_every
+
+    def checkpoint(self, state, now):
+        # Statements appending the buffered events and saving the replay checkpoint; the
+        # state itself is left untouched until saved()
+        events = list(state.pending_events)
+        statements = []
+        if events:
+            statements.append((
+                "INSERT OR IGNORE INTO battle_events (battle_id, seq, actor_id, action, payload) VALUES "
+                + ", ".join("(?, ?, ?, ?, ?)" for _ in events),
+                tuple(value for e in events for value in (state.id, e.seq, e.actor_id, e.code, json.dumps(e.payload, separators=(",", ":"))))
+            ))
+        statements.append((
+            "UPDATE battles SET state_json=?, status=?, finished_at=? WHERE id=?",
+            (state.snapshot(), state.status, now if state.status != "active" else None, state.id)
+        ))
+        return Checkpoint(state, len(state.actions), len(events), statements)
+
+    def saved(self, checkpoints, evict=False, clock=None):
+        # Called once the checkpoints' statements have committed. Actions applied while
+        # the write was in flight stay pending for the next checkpoint. Finished battles
+        # leave memory, and with evict=True so do those still idle.
+        clock = clock or time.monotonic()
+        for checkpoint in checkpoints:
+            state = checkpoint.state
+            state.saved_actions = max(state.saved_actions, checkpoint.actions)
+            del state.pending_events[:checkpoint.events]
+            if state.status != "active" or (evict and self.idle(state, clock)):
+                if self.active.get(state.id) is state:
+                    del self.active[state.id]
+
+async def fetch_battle_tails(db, battles, limit=3, special_cooldown=3):
+    # Last `limit` event lines per battle (BattleRow list with state_json). Reads only the
+    # tail of battle_events; battles whose stored events stop short of the checkpoint
+    # (archived, or restored from a backup that predates them) are replayed instead.
+    tails = {}
+    ids = [battle.id for battle in battles if battle.state_json]
+    if not ids:
+        return tails
+    async with db.execute(
+        "SELECT battle_id, seq, actor_id, action, payload FROM ("
+        " SELECT *, ROW_NUMBER() OVER (PARTITION BY battle_id ORDER BY seq DESC) AS rn FROM battle_events"
+        f" WHERE battle_id IN ({', '.join('?' for _ in ids)})"
+        ") WHERE rn <= ? ORDER BY battle_id, seq",
+        (*ids, limit)
+    ) as cursor:
+        rows = await cursor.fetchall()
+    events = {}
+    for battle_id, seq, actor_id, code, payload in rows:
+        events.setdefault(battle_id, []).append(BattleEvent(seq, actor_id, code, json.loads(payload)))
+    for battle in battles:
+        if not battle.state_json:
+            continue
+        saved = json.loads(battle.state_json)
+        names = {c["combatant_id"]: c["name"] for c in saved["setup"]}
+        special_names = {c["combatant_id"]: c["special_name"] for c in saved["setup"]}
+        tail = events.get(battle.id)
+        # Checkpoints from before the event count was saved can't be checked: replay them
+        expected = saved.get("events")
+        stale = tail is None or expected is None or tail[-1].seq < expected
+        if stale and saved["actions"]:
+            state = BattleState.replay(
+                battle.id, battle.type, battle.seed, saved["setup"], saved["actions"],
+                saved.get("cooldown", special_cooldown), keep_events=True
+            )
+            tail = state.pending_events[-limit:]
+        tails[battle.id] = [describe_event(names, event, special_names) for event in tail or []]
+    return tails
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import random
+from datetime import datetime
+
+logger = logging.getLogger("elysium.spawn")
+
+WON = "won"
+LOST = "lost"
+TOO_FAST = "too_fast"
+DUPLICATE = "duplicate"
+GONE = "gone"
+
+class ClaimEntry:
+    __slots__ = ("user_id", "slot", "claimed_at", "future")
+
+    def __init__(self, user_id, slot, claimed_at, future=None):
+        self.user_id = user_id
+        self.slot = slot
+        self.claimed_at = claimed_at
+        self.future = future
+
+class ClaimResult:
+    __slots__ = ("status", "winner_id", "slot")
+
+    def __init__(self, status, winner_id=None, slot=None):
+        self.status = status
+        self.winner_id = winner_id
+        self.slot = slot
+
+def arbitrate(claims, announced_at, min_typing_delay, rng=random):
+    # Returns (winner, too_fast). Claims sent sooner than min_typing_delay after the
+    # announcement are rejected; the winner is drawn uniformly from the rest, in a fixed
+    # order so a seeded rng always picks the same claim.
+    ordered = sorted(claims, key=lambda c: (c.claimed_at, c.user_id))
+    too_fast = [c for c in ordered if c.claimed_at - announced_at < min_typing_delay]
+    eligible = [c for c in ordered if c.claimed_at - announced_at >= min_typing_delay]
+    return (rng.choice(eligible) if eligible else None), too_fast
+
+class ClaimArbiter:
+    # Collects the claims on a spawn for `window` seconds after the first one, then
+    # settles them together: one compare-and-set UPDATE per spawn and every waiting
+    # claim answered at the same moment.
+
+    def __init__(self, bot, window=2.0, min_typing_delay=0.6, seed=None):
+        self.bot = bot
+        self.window = window
+        self.min_typing_delay = min_typing_delay
+        self.rng = random.Random(seed)
+        self.pending = {}
+        self.tasks = set()
+
+    async def submit(self, spawn, user_id, slot, claimed_at):
+        claims = self.pending.get(spawn.id)
+        if claims is None:
+            claims = self.pending[spawn.id] = {}
+            task = asyncio.create_task(self.close_after(spawn))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        if user_id in claims:
+            return ClaimResult(DUPLICATE)
+        entry = ClaimEntry(user_id, slot, claimed_at, asyncio.get_running_loop().create_future())
+        claims[user_id] = entry
+        return await entry.future
+
+    async def close_after(self, spawn):
+        await asyncio.sleep(self.window)
+        claims = list(self.pending.pop(spawn.id).values())
+        # Off the live registry while settling so late clicks see no spawn
+        self.bot.spawn_registry.remove(spawn.id)
+        try:
+            results = await self.settle(spawn, claims)
+        except Exception as e:
+            logger.error(f"Claim arbitration for spawn {spawn.id} failed: {e}")
+            results = {}
+        for entry in claims:
+            if not entry.future.done():
+                entry.future.set_result(results.get(entry.user_id, ClaimResult(GONE)))
+
+    async def settle(self, spawn, claims):
+        winner, too_fast = arbitrate(claims, spawn.announced_at, self.min_typing_delay, self.rng)
+        results = {entry.user_id: ClaimResult(TOO_FAST) for entry in too_fast}
+        if winner is None:
+            if spawn.expires_at > datetime.utcnow().timestamp():
+                self.bot.spawn_registry.add(spawn)
+            return results
+        now = int(datetime.utcnow().timestamp())
+        _, won = await self.bot.db.commit_write(
+            "UPDATE active_spawns SET claimed_by=?, claim_slot=?, claim_time=? WHERE id=? AND claimed_by IS NULL AND expires_at > ?",
+            (winner.user_id, winner.slot, now, spawn.id, now)
+        )
+        if not won:
+            return results
+        for entry in claims:
+            if entry.user_id not in results:
+                results[entry.user_id] = ClaimResult(WON if entry is winner else LOST, winner.user_id, winner.slot)
+        return results
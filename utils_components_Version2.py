@@ -0,0 +1,77 @@
+import logging
+
+logger = logging.getLogger("elysium.components")
+
+ID_VERSION = "e1"
+SEPARATOR = ":"
+MAX_CUSTOM_ID = 100
+
+def component_id(prefix, *args):
+    # "e1:battle:42:attack" - version tag, route prefix, then the handler's arguments
+    custom_id = SEPARATOR.join((ID_VERSION, prefix, *(str(arg) for arg in args)))
+    if len(custom_id) > MAX_CUSTOM_ID:
+        raise ValueError(f"custom_id longer than {MAX_CUSTOM_ID} characters: {custom_id!r}")
+    return custom_id
+
+def parse_component_id(custom_id):
+    # (prefix, [args]). Ids from before the router ("battle_42_attack") are read as
+    # prefix_arg_arg so buttons on messages already posted keep working
+    if custom_id.startswith(ID_VERSION + SEPARATOR):
+        parts = custom_id.split(SEPARATOR)
+        return parts[1], parts[2:]
+    parts = custom_id.split("_")
+    return parts[0], parts[1:]
+
+class Route:
+    __slots__ = ("handler", "converters")
+
+    def __init__(self, handler, converters):
+        self.handler = handler
+        self.converters = converters
+
+class ComponentRouter:
+    # Routes every component interaction by the prefix of its custom_id to a handler
+    # registered by the owning cog. Handlers load whatever state they need from memory or
+    # the database, so no View is kept per message and buttons keep working across
+    # restarts; dispatch is one parse and one dict lookup however many messages are live.
+
+    def __init__(self):
+        self.routes = {}
+        self.stats = {"dispatched": 0, "unrouted": 0, "failed": 0}
+
+    def register(self, prefix, handler, *converters):
+        # handler(interaction, *args), each arg converted by the matching converter
+        if not prefix or SEPARATOR in prefix or "_" in prefix:
+            raise ValueError(f"Invalid component prefix: {prefix!r}")
+        self.routes[prefix] = Route(handler, converters)
+
+    def unregister(self, prefix):
+        self.routes.pop(prefix, None)
+
+    def resolve(self, custom_id):
+        # (route, converted args), or None when nothing handles this id
+        prefix, args = parse_component_id(custom_id)
+        route = self.routes.get(prefix)
+        if route is None or len(args) != len(route.converters):
+            return None
+        try:
+            return route, [convert(arg) for convert, arg in zip(route.converters, args)]
+        except ValueError:
+            return None
+
+    async def dispatch(self, interaction):
+        custom_id = (interaction.data or {}).get("custom_id")
+        resolved = custom_id and self.resolve(custom_id)
+        if not resolved:
+            self.stats["unrouted"] += 1
+            return False
+        route, args = resolved
+        self.stats["dispatched"] += 1
+        try:
+            await route.handler(interaction, *args)
+        except Exception:
+            self.stats["failed"] += 1
+            logger.exception(f"Component {custom_id} failed")
+            if not interaction.response.is_done():
+                await interaction.response.send_message("Something went wrong, please try again.", ephemeral=True)
+        return True
@@ -0,0 +1,60 @@
+from utils.db import fetch_one, CounterRow
+
+COUNTERS = ("items", "artifacts", "open_offers")
+
+# What player_counters should hold, recomputed from the source tables
+RECOUNT_SQL = """
+SELECT player_id, SUM(items), SUM(artifacts), SUM(open_offers) FROM (
+    SELECT player_id, COUNT(*) AS items, COUNT(artifact_id) AS artifacts, 0 AS open_offers
+    FROM inventory GROUP BY player_id
+    UNION ALL
+    SELECT seller_id, 0, 0, COUNT(*) FROM trades WHERE status = 'open' GROUP BY seller_id
+) GROUP BY player_id
+"""
+
+class CounterDrift:
+    __slots__ = ("player_id", "stored", "actual")
+
+    def __init__(self, player_id, stored, actual):
+        self.player_id = player_id
+        self.stored = stored
+        self.actual = actual
+
+    def describe(self):
+        changes = [
+            f"{name} {was}→{now}" for name, was, now in zip(COUNTERS, self.stored, self.actual) if was != now
+        ]
+        return f"player {self.player_id}: {', '.join(changes)}"
+
+async def get_counters(db, player_id):
+    # One primary-key lookup; players with nothing counted yet read as zeros
+    row = await fetch_one(db, "SELECT * FROM player_counters WHERE player_id=?", (player_id,), CounterRow)
+    return row or CounterRow(player_id, 0, 0, 0)
+
+async def repair_counters(db):
+    # Recounts every player from inventory and trades and rewrites the rows that drifted
+    # from the triggers (migration 7). Runs in one transaction on the writer, so no
+    # counted write can land between the recount and the fix. Returns the drift found.
+    await db.execute("BEGIN")
+    try:
+        async with db.execute("SELECT player_id, items, artifacts, open_offers FROM player_counters") as cursor:
+            stored = {row[0]: tuple(row[1:]) for row in await cursor.fetchall()}
+        async with db.execute(RECOUNT_SQL) as cursor:
+            actual = {row[0]: tuple(row[1:]) for row in await cursor.fetchall()}
+        zero = (0,) * len(COUNTERS)
+        drift = [
+            CounterDrift(player_id, stored.get(player_id, zero), actual.get(player_id, zero))
+            for player_id in stored.keys() | actual.keys()
+            if stored.get(player_id, zero) != actual.get(player_id, zero)
+        ]
+        await db.executemany(
+            "INSERT INTO player_counters (player_id, items, artifacts, open_offers) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(player_id) DO UPDATE SET items=excluded.items, artifacts=excluded.artifacts, open_offers=excluded.open_offers",
+            [(d.player_id, *d.actual) for d in drift]
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    drift.sort(key=lambda d: d.player_id)
+    return drift
@@ -1,28 +1,427 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import time
 import aiosqlite
+from operator import itemgetter
 from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Optional
 
 DB_PATH = "elysium.db"
 
-async def run_migrations(db_path=DB_PATH, migrations_file="migrations.sql"):
-    async with aiosqlite.connect(db_path) as db:
-        with open(migrations_file, "r", encoding="utf-8") as f:
-            sql = f.read()
-        await db.executescript(sql)
-        await db.commit()
+# --- MIGRATIONS ---
 
-@asynccontextmanager
-async def db_ctx(db):
-    yield db
+MIGRATIONS_PATH = "migrations.sql"
+MIGRATION_MARKER = re.compile(r"^-- migration: (\d+) (.+)$", re.M)
 
-async def get_player_profile(db, discord_id):
-    async with db.execute("SELECT * FROM players WHERE discord_id=?", (discord_id,)) as cursor:
+class Migration:
+    __slots__ = ("version", "name", "sql", "checksum")
+
+    def __init__(self, version, name, sql):
+        self.version = version
+        self.name = name
+        self.sql = sql
+        self.checksum = hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+def load_migrations(migrations_file=MIGRATIONS_PATH):
+    # Splits migrations.sql on "-- migration: <version> <name>" lines
+    with open(migrations_file, "r", encoding="utf-8") as f:
+        text = f.read()
+    marks = list(MIGRATION_MARKER.finditer(text))
+    migrations = []
+    for i, mark in enumerate(marks):
+        end = marks[i + 1].start() if i + 1 < len(marks) else len(text)
+        migration = Migration(int(mark.group(1)), mark.group(2).strip(), text[mark.end():end].strip())
+        if migrations and migration.version <= migrations[-1].version:
+            raise ValueError(f"Migration {migration.version} is out of order in {migrations_file}")
+        migrations.append(migration)
+    return migrations
+
+async def applied_migrations(db):
+    try:
+        async with db.execute("SELECT version, checksum FROM db_version") as cursor:
+            return dict(await cursor.fetchall())
+    except sqlite3.OperationalError:
+        pass
+    # New database, or the old bare db_version table from before versioned migrations
+    await db.execute(
+        "CREATE TABLE IF NOT EXISTS db_version (version INTEGER PRIMARY KEY, name TEXT, checksum TEXT, applied_at INTEGER)"
+    )
+    async with db.execute("PRAGMA table_info(db_version)") as cursor:
+        columns = [row[1] for row in await cursor.fetchall()]
+    for column, decl in (("name", "TEXT"), ("checksum", "TEXT"), ("applied_at", "INTEGER")):
+        if column not in columns:
+            await db.execute(f"ALTER TABLE db_version ADD COLUMN {column} {decl}")
+    await db.commit()
+    async with db.execute("SELECT version, checksum FROM db_version") as cursor:
+        return dict(await cursor.fetchall())
+
+async def run_migrations(db, migrations_file=MIGRATIONS_PATH):
+    # Applies pending steps in order, each in its own transaction together with its
+    # db_version row. On an up-to-date database this is one SELECT. Returns the
+    # versions applied.
+    migrations = load_migrations(migrations_file)
+    applied = await applied_migrations(db)
+    for migration in migrations:
+        checksum = applied.get(migration.version)
+        if checksum and checksum != migration.checksum:
+            raise RuntimeError(f"Migration {migration.version} ({migration.name}) was edited after it was applied")
+    pending = [migration for migration in migrations if migration.version not in applied]
+    if not pending:
+        return []
+    async with db.execute("PRAGMA journal_mode=WAL"):
+        pass
+    for migration in pending:
+        record = (
+            "INSERT INTO db_version (version, name, checksum, applied_at) VALUES "
+            f"({migration.version}, '{migration.name.replace(chr(39), chr(39) * 2)}', '{migration.checksum}', strftime('%s','now'));"
+        )
+        try:
+            # executescript runs statements as-is, so the script carries its own BEGIN/COMMIT
+            await db.executescript(f"BEGIN;\n{migration.sql}\n;\n{record}\nCOMMIT;")
+        except Exception:
+            await db.rollback()
+            raise
+    return [migration.version for migration in pending]
+
+# --- ROW MAPPING ---
+
+class Record:
+    # Base for the slotted row dataclasses below. Supports both attribute and mapping-style
+    # access so rows can be handed straight to the embed builders.
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self.__slots__
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+@dataclass(slots=True)
+class PlayerRow(Record):
+    id: int
+    discord_id: int
+    name: str
+    xp: int
+    level: int
+    prestige: int
+    faction: Optional[str]
+    shiny_unlocked: int
+    shiny_variant_tag: Optional[str]
+    premium_expires_at: Optional[int]
+    profile_title: Optional[str]
+    profile_bio: Optional[str]
+    accent_color: Optional[str]
+    frame: Optional[str]
+    banner_url: Optional[str]
+    weekly_summary_opt_in: int
+    created_at: int
+
+@dataclass(slots=True)
+class SpawnRow(Record):
+    id: int
+    guild_id: int
+    channel_id: int
+    npc_ids: str
+    spawn_type: str
+    created_at: int
+    expires_at: Optional[int]
+    claimed_by: Optional[int]
+    claim_slot: Optional[int]
+    claim_time: Optional[int]
+
+@dataclass(slots=True)
+class BattleRow(Record):
+    id: int
+    guild_id: int
+    type: str
+    challenger_id: int
+    opponent_id: Optional[int]
+    status: str
+    started_at: int
+    finished_at: Optional[int]
+    log_json: Optional[str]
+    seed: Optional[int]
+    state_json: Optional[str]
+
+@dataclass(slots=True)
+class TradeRow(Record):
+    id: int
+    seller_id: int
+    buyer_id: Optional[int]
+    item_type: str
+    item_id: int
+    price: int
+    status: str
+    created_at: int
+    accepted_at: Optional[int]
+    declined_at: Optional[int]
+
+@dataclass(slots=True)
+class CounterRow(Record):
+    player_id: int
+    items: int
+    artifacts: int
+    open_offers: int
+
+@dataclass(slots=True)
+class PremiumRow(Record):
+    id: int
+    kind: str
+    user_id: Optional[int]
+    guild_id: Optional[int]
+    expires_at: Optional[int]
+    granted_by: Optional[int]
+    reason: Optional[str]
+    notified_7d: int
+    notified_48h: int
+
+_mappers = {}
+
+def row_mapper(cursor, record=None):
+    # Builds (and caches per record type and column list) a function turning a raw row
+    # into a record, or into a dict when no record type is given
+    columns = tuple(col[0] for col in cursor.description)
+    key = (record, columns)
+    mapper = _mappers.get(key)
+    if mapper is None:
+        if record is None:
+            mapper = lambda row: dict(zip(columns, row))
+        else:
+            index = {name: i for i, name in enumerate(columns)}
+            # Columns the statement did not select read from a trailing None
+            positions = [index.get(name, len(columns)) for name in record.__slots__]
+            if columns == record.__slots__:
+                mapper = lambda row: record(*row)
+            elif len(columns) in positions:
+                getter = itemgetter(*positions)
+                mapper = lambda row: record(*getter(row + (None,)))
+            else:
+                getter = itemgetter(*positions)
+                mapper = lambda row: record(*getter(row))
+        _mappers[key] = mapper
+    return mapper
+
+async def fetch_one(db, sql, params=(), record=None):
+    async with db.execute(sql, params) as cursor:
         row = await cursor.fetchone()
-        if not row:
+        if row is None:
             return None
-        return dict(zip([col[0] for col in cursor.description], row))
+        return row_mapper(cursor, record)(row)
+
+async def fetch_all(db, sql, params=(), record=None):
+    async with db.execute(sql, params) as cursor:
+        rows = await cursor.fetchall()
+        mapper = row_mapper(cursor, record)
+    return [mapper(row) for row in rows]
+
+# --- CONNECTIONS ---
+
+class WriteCoalescer:
+    # Group commit for small writes: statements queued by concurrent callers run in one
+    # transaction on the pool's writer, committed every `flush_interval` seconds or as
+    # soon as `max_statements` are waiting. Each caller's group runs in its own savepoint,
+    # so one failing caller does not roll back the others, and each caller resumes only
+    # after the shared COMMIT has returned.
+
+    def __init__(self, pool, flush_interval=0.005, max_statements=200):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.max_statements = max_statements
+        self.queue = []
+        self.pending = 0
+        self._has_items = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = None
+        self._closing = False
+        self.started_at = time.monotonic()
+        self.stats = {"commits": 0, "statements": 0, "max_batch": 0, "failed_groups": 0}
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, statements):
+        # statements: list of (sql, params); returns [(lastrowid, rowcount), ...]
+        if self._closing:
+            raise RuntimeError("Write coalescer is closed")
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append((statements, future))
+        self.pending += len(statements)
+        self._has_items.set()
+        if self.pending >= self.max_statements:
+            self._full.set()
+        return await future
+
+    async def _run(self):
+        while not (self._closing and not self.queue):
+            if not self.queue:
+                self._has_items.clear()
+                await self._has_items.wait()
+                continue
+            if not self._closing:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self):
+        batch, self.queue, self.pending = self.queue, [], 0
+        if not batch:
+            return
+        outcomes = []
+        async with self.pool.write() as db:
+            try:
+                await db.execute("BEGIN")
+                for statements, future in batch:
+                    await db.execute("SAVEPOINT coalesced")
+                    try:
+                        results = []
+                        for sql, params in statements:
+                            cursor = await db.execute(sql, params)
+                            results.append((cursor.lastrowid, cursor.rowcount))
+                            await cursor.close()
+                        await db.execute("RELEASE coalesced")
+                        outcomes.append((future, results, None))
+                    except Exception as e:
+                        await db.execute("ROLLBACK TO coalesced")
+                        await db.execute("RELEASE coalesced")
+                        self.stats["failed_groups"] += 1
+                        outcomes.append((future, None, e))
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                outcomes = [(future, None, e) for _, future in batch]
+        statements = sum(len(group) for group, _ in batch)
+        self.stats["commits"] += 1
+        self.stats["statements"] += statements
+        self.stats["max_batch"] = max(self.stats["max_batch"], statements)
+        for future, results, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results)
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        commits = self.stats["commits"]
+        return dict(
+            self.stats,
+            commits_per_second=commits / elapsed,
+            avg_batch=self.stats["statements"] / commits if commits else 0.0,
+        )
+
+    async def close(self):
+        self._closing = True
+        self._has_items.set()
+        self._full.set()
+        if self._task:
+            await self._task
+        else:
+            await self.flush()
+
+class DBPool:
+    # One writer connection plus N read-only connections on the same WAL database, so
+    # reads never queue behind the writer's worker thread. Writers are serialized by a
+    # lock held for the whole `db_ctx(..., readonly=False)` block.
+
+    def __init__(self, path=DB_PATH, readers=4, flush_interval=0.005, max_batch_statements=200):
+        self.path = path
+        self.size = readers
+        self.writer = None
+        self.coalescer = WriteCoalescer(self, flush_interval, max_batch_statements)
+        self._readers = asyncio.Queue()
+        self._connections = []
+        self._write_lock = asyncio.Lock()
+        self.stats = {
+            "read_acquires": 0,
+            "read_wait_total": 0.0,
+            "read_wait_max": 0.0,
+            "write_acquires": 0,
+            "write_wait_total": 0.0,
+            "write_wait_max": 0.0,
+        }
+
+    async def open(self):
+        self.writer = await aiosqlite.connect(self.path, isolation_level=None)
+        self.coalescer.start()
+
+    async def open_readers(self):
+        # Opened after migrations so the database file exists and is already in WAL mode
+        for _ in range(self.size):
+            conn = await aiosqlite.connect(f"file:{self.path}?mode=ro", uri=True, isolation_level=None)
+            self._connections.append(conn)
+            self._readers.put_nowait(conn)
+
+    async def commit_write(self, sql, params=()):
+        # Queue one statement for the next group commit; returns (lastrowid, rowcount)
+        results = await self.coalescer.submit([(sql, params)])
+        return results[0]
+
+    async def commit_writes(self, statements):
+        # Queue several statements that must commit together
+        return await self.coalescer.submit(statements)
+
+    async def close(self):
+        await self.coalescer.close()
+        for conn in self._connections:
+            await conn.close()
+        self._connections = []
+        if self.writer:
+            await self.writer.close()
+            self.writer = None
+
+    def _record(self, kind, waited):
+        self.stats[f"{kind}_acquires"] += 1
+        self.stats[f"{kind}_wait_total"] += waited
+        self.stats[f"{kind}_wait_max"] = max(self.stats[f"{kind}_wait_max"], waited)
+
+    @asynccontextmanager
+    async def read(self):
+        if not self._connections:
+            # No readers yet (startup, migrations): fall back to the writer
+            async with self.write() as conn:
+                yield conn
+            return
+        started = time.perf_counter()
+        conn = await self._readers.get()
+        self._record("read", time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self):
+        started = time.perf_counter()
+        async with self._write_lock:
+            self._record("write", time.perf_counter() - started)
+            yield self.writer
+
+@asynccontextmanager
+async def db_ctx(db, readonly=False):
+    if isinstance(db, DBPool):
+        async with (db.read() if readonly else db.write()) as conn:
+            yield conn
+    else:
+        yield db
+
+async def get_player_profile(db, discord_id):
+    return await fetch_one(db, "SELECT * FROM players WHERE discord_id=?", (discord_id,), PlayerRow)
 
 async def upsert_player_profile(db, discord_id, name, title=None, bio=None, accent_color=None, banner_url=None):
-    async with db.execute("SELECT * FROM players WHERE discord_id=?", (discord_id,)) as cursor:
+    async with db.execute("SELECT 1 FROM players WHERE discord_id=?", (discord_id,)) as cursor:
         row = await cursor.fetchone()
     if not row:
         await db.execute(
@@ -37,13 +436,13 @@ async def upsert_player_profile(db, discord_id, name, title=None, bio=None, acce
     await db.commit()
 
 async def change_prefix(db, guild_id, new_prefix):
-    async with db.execute("SELECT * FROM guilds WHERE id=?", (guild_id,)) as cursor:
+    async with db.execute("SELECT settings_json FROM guilds WHERE id=?", (guild_id,)) as cursor:
         row = await cursor.fetchone()
     if not row:
         await db.execute("INSERT INTO guilds (id, settings_json) VALUES (?, ?)", (guild_id, f'{{"prefix": "{new_prefix}"}}'))
     else:
         import json
-        settings = json.loads(row[4] or "{}")
+        settings = json.loads(row[0] or "{}")
         settings["prefix"] = new_prefix
         await db.execute("UPDATE guilds SET settings_json=? WHERE id=?", (json.dumps(settings), guild_id))
     await db.commit()
\ No newline at end of file
@@ -50,7 +50,11 @@ def make_world_summary_embed(settlements, guild):
         color=0x66CC66
     )
     for s in settlements:
-        embed.add_field(name=s["name"], value=f"Level {s['level']}", inline=True)
+        value = f"Level {s['level']}"
+        resources = s.get("resources")
+        if resources:
+            value += "\n" + " • ".join(f"{name.capitalize()} {amount}" for name, amount in resources.items())
+        embed.add_field(name=s["name"], value=value, inline=True)
     embed.set_footer(text="World tick summary")
     return embed
 
@@ -65,16 +69,27 @@ def make_spawn_embed(npcs, expires_at):
     embed.set_footer(text="Elysium Protocol Spawn")
     return embed
 
-def make_battle_embed(logs, user):
+def make_expired_spawn_embed():
+    embed = discord.Embed(
+        title="This spawn has expired",
+        description="It can no longer be claimed. Watch for the next one!",
+        color=0x808080
+    )
+    embed.set_footer(text="Elysium Protocol Spawn")
+    return embed
+
+def make_battle_embed(logs, user, tails=None):
     embed = discord.Embed(
         title="Recent Battles",
         description=f"For {user.display_name}",
         color=0xA259F7
     )
+    tails = tails or {}
     for log in logs:
+        tail = "\n".join(tails.get(log["id"], [])) or "No moves yet."
         embed.add_field(
             name=f"{log['type'].capitalize()} • {log['status']}",
-            value=f"Started: <t:{log['started_at']}:R>\nLog: {log['log_json'][:128]}...",
+            value=f"Started: <t:{log['started_at']}:R>\n{tail[-900:]}",
             inline=False
         )
     embed.set_footer(text="Elysium Protocol Battles")
@@ -107,12 +122,30 @@ def make_trade_embed(offers, user):
     embed.set_footer(text="Elysium Protocol Marketplace")
     return embed
 
+def make_market_embed(offers, page, item_type=None, min_price=None, max_price=None):
+    filters = [item_type.capitalize() if item_type else "All items"]
+    if min_price is not None or max_price is not None:
+        filters.append(f"Price {min_price if min_price is not None else 0}–{max_price if max_price is not None else '∞'}")
+    embed = discord.Embed(
+        title="Marketplace",
+        description=" • ".join(filters),
+        color=0x3399FF
+    )
+    for offer in offers:
+        embed.add_field(
+            name=f"{offer['item_type'].capitalize()} #{offer['item_id']}",
+            value=f"Price: {offer['price']} • Seller: <@{offer['seller_id']}>",
+            inline=False
+        )
+    embed.set_footer(text=f"Elysium Protocol Marketplace • Page {page}")
+    return embed
+
 def make_crafting_embed(recipes):
     embed = discord.Embed(
         title="Crafting Recipes",
         color=0xFFD700
     )
-    for recipe in recipes:
+    for recipe in recipes[:25]:
         embed.add_field(
             name=recipe["name"],
             value=f"Rarity: {recipe['rarity']}\nEffect: {recipe.get('effect', 'N/A')}",
@@ -121,11 +154,13 @@ def make_crafting_embed(recipes):
     embed.set_footer(text="Elysium Protocol Crafting")
     return embed
 
-def make_premium_embed(status, user, guild):
+def make_premium_embed(status, user, guild, bot_premium=False):
     embed = discord.Embed(
         title="Premium Status",
         color=0xFF3860
     )
+    if bot_premium:
+        embed.add_field(name="Bot Premium Mode", value="Active for everyone: boosted spawns, XP, loot and shiny odds.", inline=False)
     for entry in status:
         who = user.mention if entry["kind"] == "user" else guild.name
         embed.add_field(
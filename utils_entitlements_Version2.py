@@ -0,0 +1,125 @@
+from datetime import datetime
+
+DEFAULT_INVENTORY_PAGES = 2
+INVENTORY_PAGE_SIZE = 10
+
+class Perks:
+    __slots__ = (
+        "user_premium", "server_premium", "bot_premium",
+        "spawn_multiplier", "xp_multiplier", "loot_multiplier",
+        "shiny_odds", "shiny_multiplier", "inventory_pages", "inventory_slots",
+    )
+
+    def __init__(self, config, user_premium, server_premium, bot_premium):
+        premium = config["premium"]
+        shiny = config["shiny"]
+        # Bot premium mode stacks its multipliers on top of everyone's own perks
+        bot = config.get("bot_premium", {}) if bot_premium else {}
+        self.user_premium = user_premium
+        self.server_premium = server_premium
+        self.bot_premium = bot_premium
+        self.spawn_multiplier = (premium["user_spawn_multiplier"] if user_premium else 1.0) * bot.get("spawn_multiplier", 1.0)
+        self.xp_multiplier = (premium["user_xp_multiplier"] if user_premium else 1.0) * bot.get("xp_multiplier", 1.0)
+        self.loot_multiplier = (premium["user_loot_multiplier"] if user_premium else 1.0) * bot.get("loot_multiplier", 1.0)
+        self.shiny_multiplier = (premium["shiny_odds_multiplier"] if user_premium else 1) * bot.get("shiny_odds_multiplier", 1)
+        odds = shiny["base_odds"]
+        if server_premium:
+            odds = max(odds, shiny["server_premium_odds"])
+        if user_premium:
+            odds = max(odds, shiny["premium_odds"])
+        self.shiny_odds = min(1.0, odds * bot.get("shiny_odds_multiplier", 1))
+        self.inventory_pages = premium["inventory_pages"] if user_premium else DEFAULT_INVENTORY_PAGES
+        self.inventory_slots = self.inventory_pages * INVENTORY_PAGE_SIZE
+
+class Entitlements:
+    # In-memory view of the premium table and settings.bot_premium_mode. Every grant,
+    # revoke, botmode toggle and expiry must go through the matching method here; lookups
+    # never touch the database. Perks for each (user, server, bot) combination are built
+    # once, so perks() is two dict lookups and a clock read.
+
+    def __init__(self, config):
+        self.config = config
+        self.users = {}
+        self.guilds = {}
+        self.bot_premium = False
+        self._perks = {
+            (u, s, b): Perks(config, u, s, b)
+            for u in (False, True) for s in (False, True) for b in (False, True)
+        }
+
+    async def load(self, db):
+        async with db.execute("SELECT kind, user_id, guild_id, expires_at FROM premium") as cursor:
+            rows = await cursor.fetchall()
+        self.users = {}
+        self.guilds = {}
+        for kind, user_id, guild_id, expires_at in rows:
+            self.grant(kind, user_id, guild_id, expires_at)
+        async with db.execute("SELECT value FROM settings WHERE key='bot_premium_mode'") as cursor:
+            row = await cursor.fetchone()
+        self.bot_premium = bool(row) and row[0] == "True"
+
+    def _table(self, kind):
+        if kind == "user":
+            return self.users
+        if kind == "server":
+            return self.guilds
+        return None
+
+    def grant(self, kind, user_id, guild_id, expires_at):
+        table = self._table(kind)
+        if table is None:
+            return
+        key = user_id if kind == "user" else guild_id
+        current = table.get(key, 0)
+        # None means no expiry; otherwise keep the latest of overlapping grants
+        if key not in table or current is not None and (expires_at is None or expires_at > current):
+            table[key] = expires_at
+
+    def revoke(self, kind, user_id=None, guild_id=None):
+        table = self._table(kind)
+        if table is not None:
+            table.pop(user_id if kind == "user" else guild_id, None)
+
+    def expire(self, kind, user_id=None, guild_id=None, now=None):
+        # Called for each expired grant; a later overlapping grant keeps the perks
+        table = self._table(kind)
+        if table is None:
+            return
+        key = user_id if kind == "user" else guild_id
+        expires_at = table.get(key)
+        now = now or datetime.utcnow().timestamp()
+        if key in table and expires_at is not None and expires_at <= now:
+            del table[key]
+
+    def set_bot_mode(self, enabled):
+        self.bot_premium = bool(enabled)
+
+    def _active(self, table, key, now):
+        if key not in table:
+            return False
+        expires_at = table[key]
+        return expires_at is None or expires_at > now
+
+    def is_user_premium(self, user_id, now=None):
+        return self._active(self.users, user_id, now or datetime.utcnow().timestamp())
+
+    def is_server_premium(self, guild_id, now=None):
+        return self._active(self.guilds, guild_id, now or datetime.utcnow().timestamp())
+
+    def perks(self, user_id, guild_id=None, now=None):
+        now = now or datetime.utcnow().timestamp()
+        return self._perks[(
+            self._active(self.users, user_id, now),
+            guild_id is not None and self._active(self.guilds, guild_id, now),
+            self.bot_premium,
+        )]
+
+    def guild_spawn_multiplier(self, guild_id, owner_id=None, now=None):
+        rates = self.config["spawn_rates"]
+        now = now or datetime.utcnow().timestamp()
+        bot = self.config.get("bot_premium", {}).get("spawn_multiplier", 1.0) if self.bot_premium else 1.0
+        if self._active(self.guilds, guild_id, now):
+            return rates["server_premium_multiplier"] * bot
+        if owner_id is not None and self._active(self.users, owner_id, now):
+            return rates["premium_multiplier"] * bot
+        return bot
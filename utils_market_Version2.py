@@ -0,0 +1,69 @@
+from utils.db import fetch_all, TradeRow
+
+ITEM_TYPES = ("npc", "artifact", "resource")
+
+class MarketPage:
+    __slots__ = ("offers", "next_cursor")
+
+    def __init__(self, offers, next_cursor):
+        self.offers = offers
+        # Sort key of the last offer shown, or None on the last page
+        self.next_cursor = next_cursor
+
+async def browse_offers(db, item_type=None, min_price=None, max_price=None, after=None, limit=5):
+    # Open offers cheapest first, keyset-paginated on (price, id): `after` is the
+    # previous page's next_cursor, so every page is index seeks on
+    # idx_trades_status_type_price (or idx_trades_status_price without a type filter).
+    # The minimum price is folded into the cursor so SQLite seeks straight to it.
+    where = "status='open'"
+    params = []
+    if item_type:
+        where += " AND item_type=?"
+        params.append(item_type)
+    if max_price is not None:
+        where += " AND price <= ?"
+        params.append(max_price)
+    if min_price is not None and (after is None or after < (min_price, 0)):
+        after = (min_price, 0)
+    if after is None:
+        sql = f"SELECT * FROM trades WHERE {where} ORDER BY price, id LIMIT ?"
+        params.append(limit + 1)
+    else:
+        sql, params = _seek(where, params, "price", after, limit + 1)
+    offers = await fetch_all(db, sql, params, TradeRow)
+    return _page(offers, limit, lambda offer: (offer.price, offer.id))
+
+async def seller_offers(db, seller_id, before=None, limit=5):
+    # A seller's open offers newest first, keyset-paginated on (created_at, id) over
+    # idx_trades_seller_status_created
+    where = "seller_id=? AND status='open'"
+    params = [seller_id]
+    if before is None:
+        sql = f"SELECT * FROM trades WHERE {where} ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+    else:
+        sql, params = _seek(where, params, "created_at", before, limit + 1, descending=True)
+    offers = await fetch_all(db, sql, params, TradeRow)
+    return _page(offers, limit, lambda offer: (offer.created_at, offer.id))
+
+def _seek(where, params, column, cursor, limit, descending=False):
+    # Rows after `cursor` in (column, id) order. SQLite only seeks on the first column of
+    # a row value like (price, id) > (?, ?) and then walks every row tied on it, so the
+    # continuation is split into two index seeks: the rest of the tie (column = ? AND
+    # id > ?), then everything past it (column > ?).
+    op, order = ("<", " DESC") if descending else (">", "")
+    value, last_id = cursor
+    sql = (
+        f"SELECT * FROM (SELECT * FROM trades WHERE {where} AND {column} = ? AND id {op} ? ORDER BY id{order} LIMIT ?) "
+        f"UNION ALL "
+        f"SELECT * FROM (SELECT * FROM trades WHERE {where} AND {column} {op} ? ORDER BY {column}{order}, id{order} LIMIT ?) "
+        f"ORDER BY {column}{order}, id{order} LIMIT ?"
+    )
+    return sql, [*params, value, last_id, limit, *params, value, limit, limit]
+
+def _page(offers, limit, key):
+    # One extra row is fetched to tell whether another page exists
+    if len(offers) <= limit:
+        return MarketPage(offers, None)
+    offers = offers[:limit]
+    return MarketPage(offers, key(offers[-1]))
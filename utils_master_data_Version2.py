@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+import os
+from utils.db import db_ctx
+
+logger = logging.getLogger("elysium.master_data")
+
+NPC_COLUMNS = (
+    "id", "name", "rarity", "category", "role", "stats_json", "abilities_json", "lore", "image_url", "shiny_asset_tag",
+)
+NPC_REQUIRED = ("id", "name", "rarity", "category", "role")
+ARTIFACT_COLUMNS = ("id", "name", "rarity", "effect", "lore", "image_url", "shiny_asset_tag")
+ARTIFACT_REQUIRED = ("id", "name", "rarity")
+
+def upsert_sql(table, columns):
+    # Bulk upsert; the WHERE keeps unchanged rows untouched so the npcs_version triggers
+    # only fire (and NPCRegistry only reloads) when a definition really changed, and no
+    # backup_changes rows are written for definitions that stayed the same
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+        f"ON CONFLICT(id) DO UPDATE SET {', '.join(f'{col}=excluded.{col}' for col in columns[1:])} "
+        f"WHERE ({', '.join(f'{table}.{col}' for col in columns[1:])}) "
+        f"IS NOT ({', '.join(f'excluded.{col}' for col in columns[1:])})"
+    )
+
+UPSERT_NPC_SQL = upsert_sql("npcs", NPC_COLUMNS)
+UPSERT_ARTIFACT_SQL = upsert_sql("artifact_templates", ARTIFACT_COLUMNS)
+
+def compact_json(value, field):
+    # stats_json/abilities_json may be written as JSON strings or plain objects in the file
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, dict):
+        raise ValueError(f"{field} must be a JSON object")
+    return json.dumps(value, separators=(",", ":"), sort_keys=True)
+
+def parse_npcs(entries):
+    rows = []
+    for entry in entries:
+        missing = [key for key in NPC_REQUIRED if entry.get(key) is None]
+        if missing:
+            raise ValueError(f"NPC {entry.get('id')!r} is missing {missing}")
+        rows.append((
+            int(entry["id"]), entry["name"], entry["rarity"], entry["category"], entry["role"],
+            compact_json(entry.get("stats_json", {}), "stats_json"),
+            compact_json(entry.get("abilities_json", {}), "abilities_json"),
+            entry.get("lore"), entry.get("image_url"), entry.get("shiny_asset_tag"),
+        ))
+    return rows
+
+def parse_artifacts(entries):
+    artifacts = []
+    for entry in entries:
+        missing = [key for key in ARTIFACT_REQUIRED if entry.get(key) is None]
+        if missing:
+            raise ValueError(f"Artifact {entry.get('id')!r} is missing {missing}")
+        artifacts.append(dict(entry, id=int(entry["id"])))
+    return tuple(artifacts)
+
+def artifact_rows(artifacts):
+    return [tuple(artifact.get(col) for col in ARTIFACT_COLUMNS) for artifact in artifacts]
+
+def read_json_sync(path):
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError(f"{path} must hold a JSON array")
+    return entries
+
+def file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+class MasterData:
+    # NPC and artifact definitions from the data/ JSON files. Both are validated and
+    # upserted into npcs and artifact_templates in one transaction (NPCRegistry then
+    # holds the NPCs with stats/abilities parsed); artifact recipes are also served from
+    # memory. refresh() re-reads a file only when its mtime or size changed and swaps the
+    # new data in once it is saved, so commands never touch the disk or parse JSON. A
+    # broken file keeps the last good data; a failed write is retried on the next poll.
+
+    def __init__(self, bot, npcs_path="data/npcs.json", artifacts_path="data/artifacts.json", poll_seconds=5):
+        self.bot = bot
+        self.npcs_path = npcs_path
+        self.artifacts_path = artifacts_path
+        self.poll_seconds = poll_seconds
+        self.stamps = {}
+        self.artifacts = ()
+        self.artifacts_by_id = {}
+
+    def changed(self, path):
+        stamp = file_stamp(path)
+        if stamp is None or stamp == self.stamps.get(path):
+            return None
+        return stamp
+
+    async def load(self, path, parse, label):
+        # (stamp, parsed) for a changed file, or None. A file that fails to parse is
+        # marked as seen so it is not re-read until it changes again.
+        stamp = self.changed(path)
+        if stamp is None:
+            return None
+        try:
+            return stamp, parse(await asyncio.to_thread(read_json_sync, path))
+        except Exception as e:
+            logger.error(f"{label} master data reload failed: {e}")
+            self.stamps[path] = stamp
+            return None
+
+    async def refresh(self):
+        # Names of the sources reloaded ("npcs", "artifacts")
+        npcs = await self.load(self.npcs_path, parse_npcs, "NPC")
+        artifacts = await self.load(self.artifacts_path, parse_artifacts, "Artifact")
+        if npcs is None and artifacts is None:
+            return []
+        try:
+            await self.upsert(npcs and npcs[1], artifacts and artifact_rows(artifacts[1]))
+        except Exception as e:
+            logger.error(f"Master data write failed: {e}")
+            return []
+        reloaded = []
+        if npcs is not None:
+            self.stamps[self.npcs_path] = npcs[0]
+            reloaded.append("npcs")
+            logger.info(f"Loaded {len(npcs[1])} NPC definitions from {self.npcs_path}")
+        if artifacts is not None:
+            self.stamps[self.artifacts_path] = artifacts[0]
+            self.artifacts, self.artifacts_by_id = artifacts[1], {artifact["id"]: artifact for artifact in artifacts[1]}
+            reloaded.append("artifacts")
+            logger.info(f"Loaded {len(artifacts[1])} artifact definitions from {self.artifacts_path}")
+        return reloaded
+
+    async def upsert(self, npcs, artifacts):
+        # npcs/artifacts: row tuples, or None to leave that table alone
+        async with db_ctx(self.bot.db) as db:
+            await db.execute("BEGIN")
+            try:
+                if npcs:
+                    await db.executemany(UPSERT_NPC_SQL, npcs)
+                if artifacts:
+                    await db.executemany(UPSERT_ARTIFACT_SQL, artifacts)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            if "npcs" in await self.refresh():
+                try:
+                    async with db_ctx(self.bot.db, readonly=True) as db:
+                        await self.bot.npc_registry.refresh(db)
+                except Exception as e:
+                    logger.error(f"NPC registry reload failed: {e}")
+
+    def artifact(self, artifact_id):
+        return self.artifacts_by_id.get(artifact_id)
@@ -0,0 +1,110 @@
+import json
+import random
+from utils.db import fetch_all
+
+RAID_CATEGORIES = ("raid", "boss")
+
+class AliasTable:
+    # Vose's alias method: O(n) build, O(1) weighted draw. Weights must sum to more than
+    # zero (see NPCRegistry._build); items weighted 0 are never drawn.
+    __slots__ = ("items", "prob", "alias")
+
+    def __init__(self, items, weights):
+        n = len(items)
+        self.items = list(items)
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError("AliasTable needs a positive total weight")
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        for i in large + small:
+            self.prob[i] = 1.0
+
+    def __len__(self):
+        return len(self.items)
+
+    def draw(self, rng=random):
+        i = int(rng.random() * len(self.items))
+        if rng.random() < self.prob[i]:
+            return self.items[i]
+        return self.items[self.alias[i]]
+
+class NPCRegistry:
+    # NPC templates held in memory, grouped by category with precomputed alias tables.
+    # The `npcs_version` setting is bumped by triggers on the npcs table, so refresh()
+    # costs one primary-key lookup when nothing has changed.
+
+    def __init__(self, rarity_weights):
+        self.rarity_weights = dict(rarity_weights)
+        self.templates = {}
+        self.by_category = {}
+        self.pools = {}
+        self.raid_pool = []
+        self.combat = {}
+        self.version = None
+
+    async def load(self, db):
+        templates = await fetch_all(db, "SELECT * FROM npcs")
+        self.version = await self._fetch_version(db)
+        self._build(templates)
+
+    async def refresh(self, db, rarity_weights=None):
+        # Reload when the npcs table or the configured rarity weights changed
+        if rarity_weights is not None and rarity_weights != self.rarity_weights:
+            self.rarity_weights = dict(rarity_weights)
+            self._build(list(self.templates.values()))
+        if await self._fetch_version(db) != self.version:
+            await self.load(db)
+
+    async def _fetch_version(self, db):
+        async with db.execute("SELECT value FROM settings WHERE key='npcs_version'") as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    def _build(self, templates):
+        by_category = {}
+        for npc in templates:
+            by_category.setdefault(npc["category"], []).append(npc)
+        pools = {}
+        for category, npcs in by_category.items():
+            weights = [max(0, self.rarity_weights.get(npc["rarity"], 1)) for npc in npcs]
+            # A category whose rarities are all weighted 0 gets no pool: sample() returns []
+            if sum(weights) > 0:
+                pools[category] = AliasTable(npcs, weights)
+        # Swap in one go so readers never see a half-built registry
+        self.templates = {npc["id"]: npc for npc in templates}
+        self.by_category = by_category
+        self.pools = pools
+        self.raid_pool = [npc for category in RAID_CATEGORIES for npc in by_category.get(category, [])]
+        self.combat = {npc["id"]: (json.loads(npc["stats_json"]), json.loads(npc["abilities_json"])) for npc in templates}
+
+    def get(self, npc_id):
+        return self.templates.get(npc_id)
+
+    def combat_profile(self, npc_id):
+        # (stats, abilities) parsed from stats_json/abilities_json once per load
+        return self.combat.get(npc_id, ({}, {}))
+
+    def sample(self, category, k, rng=random):
+        pool = self.pools.get(category)
+        if not pool:
+            return []
+        return [pool.draw(rng) for _ in range(k)]
+
+    def random_raid_boss(self, rng=random):
+        if not self.raid_pool:
+            return None
+        return rng.choice(self.raid_pool)
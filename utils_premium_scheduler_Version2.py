@@ -0,0 +1,144 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime
+from utils.db import db_ctx
+
+logger = logging.getLogger("elysium.premium")
+
+REMIND_7D = 7 * 24 * 3600
+REMIND_48H = 48 * 3600
+MAX_SLEEP = 3600
+
+STAGE_7D = 0
+STAGE_48H = 1
+STAGE_EXPIRE = 2
+
+class PremiumEntry:
+    __slots__ = ("id", "kind", "user_id", "guild_id", "expires_at", "stage")
+
+    def __init__(self, premium_id, kind, user_id, guild_id, expires_at, notified_7d=0, notified_48h=0):
+        self.id = premium_id
+        self.kind = kind
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.expires_at = expires_at
+        self.stage = STAGE_EXPIRE if notified_48h else STAGE_48H if notified_7d else STAGE_7D
+
+    def due_at(self, stage=None):
+        stage = self.stage if stage is None else stage
+        if stage == STAGE_7D:
+            return self.expires_at - REMIND_7D
+        if stage == STAGE_48H:
+            return self.expires_at - REMIND_48H
+        return self.expires_at
+
+class PremiumExpiryScheduler:
+    # Keeps the next deadline (7-day reminder, 48-hour reminder, expiry) of every premium
+    # grant in a min-heap and sleeps until the earliest one. Heap items are
+    # (due_at, premium_id, stage); items that no longer match the tracked entry (revoked,
+    # or already advanced) are dropped lazily when popped.
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.entries = {}
+        self.heap = []
+        self.wakeup = asyncio.Event()
+
+    async def load(self, db):
+        async with db.execute(
+            "SELECT id, kind, user_id, guild_id, expires_at, notified_7d, notified_48h FROM premium WHERE expires_at IS NOT NULL ORDER BY expires_at"
+        ) as cursor:
+            rows = await cursor.fetchall()
+        self.entries = {}
+        self.heap = []
+        for row in rows:
+            self._track(PremiumEntry(*row))
+        heapq.heapify(self.heap)
+
+    def _track(self, entry):
+        self.entries[entry.id] = entry
+        self.heap.append((entry.due_at(), entry.id, entry.stage))
+
+    def schedule(self, premium_id, kind, user_id, guild_id, expires_at):
+        entry = PremiumEntry(premium_id, kind, user_id, guild_id, expires_at)
+        self.entries[entry.id] = entry
+        heapq.heappush(self.heap, (entry.due_at(), entry.id, entry.stage))
+        self.wakeup.set()
+
+    def cancel(self, kind, user_id=None, guild_id=None):
+        for premium_id, entry in list(self.entries.items()):
+            if entry.kind == kind and (user_id is None or entry.user_id == user_id) and (guild_id is None or entry.guild_id == guild_id):
+                del self.entries[premium_id]
+
+    async def run(self):
+        while True:
+            # Same clock the premium rows are written with
+            now = datetime.utcnow().timestamp()
+            if self.heap and self.heap[0][0] <= now:
+                try:
+                    await self.process_due(now)
+                except Exception as e:
+                    logger.error(f"Premium expiry processing failed: {e}")
+                    await asyncio.sleep(60)
+                continue
+            timeout = min(self.heap[0][0] - now, MAX_SLEEP) if self.heap else MAX_SLEEP
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def process_due(self, now):
+        # Due items are popped but entries are only advanced or dropped once the write
+        # commits; if it fails the popped items go back on the heap for the next pass
+        popped = []
+        reminders = []
+        expired = []
+        while self.heap and self.heap[0][0] <= now:
+            item = heapq.heappop(self.heap)
+            popped.append(item)
+            _, premium_id, stage = item
+            entry = self.entries.get(premium_id)
+            if entry is None or entry.stage != stage:
+                continue
+            # Skip straight past every deadline already reached so a late grant only
+            # gets its most urgent notice
+            while stage < STAGE_EXPIRE and entry.due_at(stage) <= now:
+                stage += 1
+            if entry.expires_at <= now:
+                expired.append(entry)
+            else:
+                reminders.append((entry, stage))
+        if not reminders and not expired:
+            return
+        try:
+            async with db_ctx(self.bot.db) as db:
+                await db.execute("BEGIN")
+                try:
+                    await db.executemany(
+                        "UPDATE premium SET notified_7d=1, notified_48h=? WHERE id=?",
+                        [(1 if stage == STAGE_EXPIRE else 0, entry.id) for entry, stage in reminders]
+                    )
+                    await db.executemany("DELETE FROM premium WHERE id=?", [(entry.id,) for entry in expired])
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    raise
+        except Exception:
+            for item in popped:
+                heapq.heappush(self.heap, item)
+            raise
+        for entry, stage in reminders:
+            entry.stage = stage
+            heapq.heappush(self.heap, (entry.due_at(), entry.id, entry.stage))
+        for entry in expired:
+            if self.entries.get(entry.id) is entry:
+                del self.entries[entry.id]
+        for entry in expired:
+            self.bot.entitlements.expire(entry.kind, entry.user_id, entry.guild_id, now)
+        for entry, stage in reminders:
+            days = 2 if stage == STAGE_EXPIRE else 7
+            await self.bot.send_premium_reminder(entry.kind, entry.user_id, entry.guild_id, entry.expires_at, days=days)
+        for entry in expired:
+            await self.bot.handle_premium_expiry_event(entry.kind, entry.user_id, entry.guild_id)
@@ -1,3 +1,5 @@
+import time
+from functools import wraps
 from discord.ext import commands
 from discord import app_commands
 
@@ -6,18 +8,127 @@ def owner_only():
         return interaction.user.id == interaction.client.owner_id
     return app_commands.check(predicate)
 
-def claim_rate_limit():
+class _Limit:
+    __slots__ = ("tokens", "last", "window", "current", "previous")
+
+    def __init__(self, tokens, last, window):
+        self.tokens = tokens
+        self.last = last
+        self.window = window
+        self.current = 0
+        self.previous = 0
+
+class RateLimiter:
+    # Per-user token bucket (one action per `rate_seconds`, bursts up to `burst`) plus an
+    # hourly sliding-window cap estimated from the current and previous fixed hour.
+    # State is one slotted object per user, kept in least recently used order: every
+    # `sweep_seconds` the entries idle longer than `idle_seconds` are popped off the front,
+    # and the least recently used are dropped when `max_entries` is exceeded.
+
+    WINDOW = 3600
+
+    def __init__(self, rate_seconds, per_hour=None, burst=1, max_entries=200000, idle_seconds=3600, sweep_seconds=60):
+        self.rate_seconds = rate_seconds
+        self.per_hour = per_hour
+        self.burst = burst
+        self.max_entries = max_entries
+        self.idle_seconds = max(idle_seconds, rate_seconds * burst)
+        self.sweep_seconds = sweep_seconds
+        self.swept_at = None
+        self.entries = {}
+
+    def check(self, user_id, now=None):
+        # Returns 0.0 when the action is allowed (and counts it), otherwise seconds to wait
+        now = time.monotonic() if now is None else now
+        if self.swept_at is None:
+            self.swept_at = now
+        elif now - self.swept_at >= self.sweep_seconds:
+            self.sweep(now)
+        window = int(now // self.WINDOW)
+        entry = self.entries.pop(user_id, None)
+        if entry is None:
+            if len(self.entries) >= self.max_entries:
+                self.evict(now)
+            entry = self.entries[user_id] = _Limit(self.burst, now, window)
+        else:
+            # Re-inserted so the dict stays in least recently used order
+            self.entries[user_id] = entry
+            if self.rate_seconds:
+                entry.tokens = min(self.burst, entry.tokens + (now - entry.last) / self.rate_seconds)
+            entry.last = now
+            if entry.window != window:
+                entry.previous = entry.current if entry.window == window - 1 else 0
+                entry.current = 0
+                entry.window = window
+        if self.rate_seconds and entry.tokens < 1:
+            return (1 - entry.tokens) * self.rate_seconds
+        if self.per_hour is not None:
+            elapsed = now - window * self.WINDOW
+            estimate = entry.previous * (1 - elapsed / self.WINDOW) + entry.current
+            if estimate >= self.per_hour:
+                return self.WINDOW - elapsed
+        if self.rate_seconds:
+            entry.tokens -= 1
+        entry.current += 1
+        return 0.0
+
+    def sweep(self, now=None):
+        # Drops entries idle for idle_seconds; they sit at the front, so this stops at the
+        # first recent one and costs O(dropped)
+        now = time.monotonic() if now is None else now
+        self.swept_at = now
+        cutoff = now - self.idle_seconds
+        stale = []
+        for user_id, entry in self.entries.items():
+            if entry.last > cutoff:
+                break
+            stale.append(user_id)
+        for user_id in stale:
+            del self.entries[user_id]
+        return len(stale)
+
+    def evict(self, now=None):
+        self.sweep(now)
+        # Still full: drop the least recently used users
+        overflow = len(self.entries) - self.max_entries + max(1, self.max_entries // 10)
+        if overflow > 0:
+            for user_id in list(self.entries)[:overflow]:
+                del self.entries[user_id]
+
+    def __len__(self):
+        return len(self.entries)
+
+def build_rate_limiters(config):
+    claim = config["claim"]
+    limiter_cfg = config.get("rate_limiter", {})
+    max_entries = limiter_cfg.get("max_tracked_users", 200000)
+    idle_seconds = limiter_cfg.get("idle_seconds", 3600)
+    sweep_seconds = limiter_cfg.get("sweep_seconds", 60)
+    limiters = {
+        "claim": RateLimiter(
+            claim["rate_limit_seconds"], claim["max_claims_per_user_per_hour"],
+            max_entries=max_entries, idle_seconds=idle_seconds, sweep_seconds=sweep_seconds
+        )
+    }
+    for name, limit in config.get("rate_limits", {}).items():
+        limiters[name] = RateLimiter(
+            limit["rate_limit_seconds"], limit.get("max_per_hour"), limit.get("burst", 1),
+            max_entries=max_entries, idle_seconds=idle_seconds, sweep_seconds=sweep_seconds
+        )
+    return limiters
+
+def rate_limited(name, message="Rate limited: try again in {retry:.0f}s."):
+    # Decorator for app command callbacks; limiters live on bot.rate_limiters
     def decorator(func):
+        @wraps(func)
         async def wrapper(self, interaction, *args, **kwargs):
-            if hasattr(interaction.user, "_last_claim") and (interaction.created_at - interaction.user._last_claim).total_seconds() < 5:
-                await interaction.response.send_message("Rate limited: wait a few seconds before claiming again.", ephemeral=True)
+            retry = interaction.client.rate_limiters[name].check(interaction.user.id)
+            if retry:
+                await interaction.response.send_message(message.format(retry=max(retry, 1)), ephemeral=True)
                 return
-            interaction.user._last_claim = interaction.created_at
             return await func(self, interaction, *args, **kwargs)
         return wrapper
     return decorator
 
-def anti_snipe_check(user_id, spawn_row):
-    if spawn_row and spawn_row[5] == user_id:
-        return False
-    return True
\ No newline at end of file
+def claim_rate_limit():
+    return rate_limited("claim", "Rate limited: wait {retry:.0f}s before claiming again.")
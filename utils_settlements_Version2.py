@@ -0,0 +1,61 @@
+import json
+from datetime import datetime
+
+# Resources accrue lazily: a settlement stores its balances as of `settled_at` plus
+# per-tick rates, and is only brought up to date when read or changed. Accrual is
+# counted in whole world ticks so the result matches the old per-tick loop.
+RESOURCES = ("food", "wood", "stone")
+
+SETTLEMENT_COLUMNS = (
+    "SELECT s.id, s.name, s.level, s.resources_json, a.settled_at, a.food_rate, a.wood_rate, a.stone_rate "
+    "FROM settlements s LEFT JOIN settlement_accrual a ON a.settlement_id = s.id"
+)
+
+def accrue(resources, rates, settled_at, now, interval):
+    ticks = max(0, (now - settled_at) // interval)
+    if ticks:
+        for name, rate in zip(RESOURCES, rates):
+            resources[name] = resources.get(name, 0) + rate * ticks
+    return resources, settled_at + ticks * interval
+
+def _current(row, now, interval):
+    settlement_id, name, level, resources_json, settled_at, *rates = row
+    resources = json.loads(resources_json or "{}")
+    if settled_at is not None:
+        resources, settled_at = accrue(resources, rates, settled_at, now, interval)
+    return {"id": settlement_id, "name": name, "level": level, "resources": resources, "settled_at": settled_at}
+
+async def get_guild_settlements(db, guild_id, interval, now=None):
+    # Read path: computes current balances without writing anything back
+    now = now or int(datetime.utcnow().timestamp())
+    async with db.execute(SETTLEMENT_COLUMNS + " WHERE s.guild_id=?", (guild_id,)) as cursor:
+        rows = await cursor.fetchall()
+    return [_current(row, now, interval) for row in rows]
+
+async def settle(db, settlement_id, interval, now=None, delta=None):
+    # Write path for trades and building: folds the accrued ticks (plus an optional
+    # change) into resources_json and moves settled_at forward in one transaction on the
+    # writer, so accrual is never counted twice or lost. Returns the new balances.
+    now = now or int(datetime.utcnow().timestamp())
+    await db.execute("BEGIN")
+    try:
+        async with db.execute(SETTLEMENT_COLUMNS + " WHERE s.id=?", (settlement_id,)) as cursor:
+            row = await cursor.fetchone()
+        if not row:
+            await db.rollback()
+            return None
+        settlement = _current(row, now, interval)
+        resources = settlement["resources"]
+        for name, amount in (delta or {}).items():
+            resources[name] = resources.get(name, 0) + amount
+        await db.execute("UPDATE settlements SET resources_json=? WHERE id=?", (json.dumps(resources), settlement_id))
+        if settlement["settled_at"] is not None:
+            await db.execute(
+                "UPDATE settlement_accrual SET settled_at=? WHERE settlement_id=?",
+                (settlement["settled_at"], settlement_id)
+            )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return resources
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from datetime import datetime
+import discord
+from utils.embeds import make_expired_spawn_embed
+from utils.timing_wheel import TimingWheel
+
+logger = logging.getLogger("elysium.spawn")
+
+class SpawnExpiry:
+    # Expires spawns at their deadline from a timing wheel fed by the spawn scheduler
+    # (and rebuilt from active_spawns at startup). Every `batch_seconds` the due spawns
+    # leave the live registry, their unclaimed rows are deleted in one range DELETE on
+    # the expires_at index, and the announcements of the spawns that were still live are
+    # edited to show they expired. Claimed spawns keep their row and their message.
+
+    def __init__(self, bot, tick=1.0, batch_seconds=2.0, max_concurrent_edits=4, edit_messages=True):
+        self.bot = bot
+        self.batch_seconds = batch_seconds
+        self.edit_messages = edit_messages
+        self.edit_limit = asyncio.Semaphore(max_concurrent_edits)
+        self.wheel = TimingWheel(tick, start=datetime.utcnow().timestamp())
+        self.messages = {}
+        self.pending_edits = set()
+        self.stats = {"expired": 0, "edited": 0, "edit_failures": 0}
+
+    async def load(self, db):
+        async with db.execute(
+            "SELECT a.id, a.expires_at, m.channel_id, m.message_id FROM active_spawns a "
+            "LEFT JOIN spawn_messages m ON m.spawn_id = a.id WHERE a.expires_at IS NOT NULL AND a.claimed_by IS NULL"
+        ) as cursor:
+            rows = await cursor.fetchall()
+        # Rebuilt from scratch so a reload (e.g. after a backup import) drops stale spawns
+        self.wheel = TimingWheel(self.wheel.tick, self.wheel.sizes, start=datetime.utcnow().timestamp())
+        self.messages = {}
+        for spawn_id, expires_at, channel_id, message_id in rows:
+            self.wheel.add(spawn_id, expires_at)
+            if message_id is not None:
+                self.messages[spawn_id] = (channel_id, message_id)
+
+    def track(self, spawn_id, expires_at):
+        self.wheel.add(spawn_id, expires_at)
+
+    async def set_message(self, spawn_id, channel_id, message_id):
+        if spawn_id not in self.wheel:
+            # Expired while the announcement was being sent
+            self.retire([(channel_id, message_id)])
+            return
+        self.messages[spawn_id] = (channel_id, message_id)
+        await self.bot.db.commit_write(
+            "INSERT OR REPLACE INTO spawn_messages (spawn_id, channel_id, message_id) VALUES (?, ?, ?)",
+            (spawn_id, channel_id, message_id)
+        )
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.batch_seconds)
+            now = datetime.utcnow().timestamp()
+            due = self.wheel.advance(now)
+            if not due:
+                continue
+            try:
+                await self.expire(due)
+            except Exception as e:
+                logger.error(f"Spawn expiry failed: {e}")
+
+    async def expire(self, due):
+        # A spawn missing from the registry was claimed (or is being settled by the claim
+        # arbiter), so its announcement is left alone
+        live = {spawn_id for spawn_id in due if self.bot.spawn_registry.remove(spawn_id) is not None}
+        # Every unclaimed spawn up to the latest due deadline has expired; spawn_messages
+        # rows go with it through trg_active_spawns_delete
+        await self.bot.db.commit_write(
+            "DELETE FROM active_spawns WHERE expires_at <= ? AND claimed_by IS NULL", (int(max(due.values())),)
+        )
+        self.stats["expired"] += len(live)
+        messages = [(spawn_id, self.messages.pop(spawn_id)) for spawn_id in due if spawn_id in self.messages]
+        messages = [message for spawn_id, message in messages if spawn_id in live]
+        if messages:
+            self.retire(messages)
+        logger.debug(f"Expired {len(due)} spawn(s)")
+
+    def retire(self, messages):
+        if not self.edit_messages:
+            return
+        task = asyncio.create_task(self.edit_batch(messages))
+        self.pending_edits.add(task)
+        task.add_done_callback(self.pending_edits.discard)
+
+    async def edit_batch(self, messages):
+        embed = make_expired_spawn_embed()
+        await asyncio.gather(*(self.edit_one(channel_id, message_id, embed) for channel_id, message_id in messages))
+
+    async def edit_one(self, channel_id, message_id, embed):
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            return
+        async with self.edit_limit:
+            try:
+                await channel.get_partial_message(message_id).edit(embed=embed)
+                self.stats["edited"] += 1
+            except discord.NotFound:
+                pass
+            except Exception as e:
+                self.stats["edit_failures"] += 1
+                logger.warning(f"Could not retire spawn message {message_id} in channel {channel_id}: {e}")
@@ -0,0 +1,65 @@
+import json
+from datetime import datetime
+
+class LiveSpawn:
+    __slots__ = ("id", "guild_id", "channel_id", "npc_ids", "expires_at", "announced_at")
+
+    def __init__(self, spawn_id, guild_id, channel_id, npc_ids, expires_at, announced_at):
+        self.id = spawn_id
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.npc_ids = npc_ids
+        self.expires_at = expires_at
+        # Epoch seconds the spawn became visible; typing delay is measured from here
+        self.announced_at = announced_at
+
+class ActiveSpawnRegistry:
+    # Unclaimed, unexpired spawns keyed by channel (oldest first) and by id. Fed by the
+    # spawn scheduler, emptied by spawn expiry and rebuilt from active_spawns at startup;
+    # the claim itself is still decided in SQL by a conditional UPDATE.
+
+    def __init__(self):
+        self.by_channel = {}
+        self.by_id = {}
+
+    async def load(self, db, now=None):
+        now = now or int(datetime.utcnow().timestamp())
+        async with db.execute(
+            "SELECT id, guild_id, channel_id, npc_ids, expires_at, created_at FROM active_spawns "
+            "WHERE claimed_by IS NULL AND expires_at > ? ORDER BY id",
+            (now,)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        self.by_channel = {}
+        self.by_id = {}
+        for spawn_id, guild_id, channel_id, npc_ids, expires_at, created_at in rows:
+            self.add(LiveSpawn(spawn_id, guild_id, channel_id, json.loads(npc_ids), expires_at, created_at))
+
+    def add(self, spawn):
+        self.by_id[spawn.id] = spawn
+        self.by_channel.setdefault(spawn.channel_id, {})[spawn.id] = spawn
+
+    def remove(self, spawn_id):
+        spawn = self.by_id.pop(spawn_id, None)
+        if spawn is None:
+            return None
+        channel = self.by_channel.get(spawn.channel_id)
+        if channel is not None:
+            channel.pop(spawn_id, None)
+            if not channel:
+                del self.by_channel[spawn.channel_id]
+        return spawn
+
+    def current(self, channel_id, now=None):
+        channel = self.by_channel.get(channel_id)
+        if not channel:
+            return None
+        now = now or int(datetime.utcnow().timestamp())
+        for spawn in list(channel.values()):
+            if spawn.expires_at > now:
+                return spawn
+            self.remove(spawn.id)
+        return None
+
+    def __len__(self):
+        return len(self.by_id)
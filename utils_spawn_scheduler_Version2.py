@@ -0,0 +1,144 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime
+from utils.db import db_ctx
+from utils.embeds import make_spawn_embed
+from utils.spawn_registry import LiveSpawn
+
+logger = logging.getLogger("elysium.spawn")
+
+SPAWN_TTL = 60
+
+class SpawnScheduler:
+    # Spreads guilds over `buckets` jittered slots of one spawn period. Each slot rolls
+    # every guild it owns in one pass, inserts the resulting spawns in a single
+    # transaction and announces them concurrently (bounded by `max_concurrent_sends`).
+
+    def __init__(self, bot, period=30, buckets=10, max_concurrent_sends=8):
+        self.bot = bot
+        self.config = bot.config
+        self.period = period
+        self.buckets = max(1, buckets)
+        self.send_limit = asyncio.Semaphore(max_concurrent_sends)
+        self.pending_sends = set()
+        self.stats = {
+            "cycles": 0,
+            "spawned": 0,
+            "last_duration": 0.0,
+            "last_lag": 0.0,
+            "max_lag": 0.0,
+            "overruns": 0,
+        }
+
+    def bucket_of(self, guild_id):
+        # Snowflake timestamp bits spread guilds evenly across slots and keep them stable
+        return (guild_id >> 22) % self.buckets
+
+    async def run(self):
+        await self.bot.wait_until_ready()
+        slot_width = self.period / self.buckets
+        start = time.monotonic()
+        cycle = 0
+        while not self.bot.is_closed():
+            cycle_start = start + cycle * self.period
+            try:
+                async with db_ctx(self.bot.db, readonly=True) as db:
+                    await self.bot.npc_registry.refresh(db, self.config["rarity_weights"])
+            except Exception as e:
+                logger.error(f"NPC registry refresh failed: {e}")
+            groups = [[] for _ in range(self.buckets)]
+            for guild in self.bot.guilds:
+                groups[self.bucket_of(guild.id)].append(guild)
+            cycle_lag = 0.0
+            for slot, guilds in enumerate(groups):
+                due = cycle_start + slot * slot_width + random.uniform(0, slot_width / 2)
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                cycle_lag = max(cycle_lag, time.monotonic() - due)
+                if not guilds:
+                    continue
+                try:
+                    await self.run_bucket(guilds)
+                except Exception as e:
+                    logger.error(f"Spawn bucket {slot} failed: {e}")
+            duration = time.monotonic() - cycle_start
+            self.stats["cycles"] += 1
+            self.stats["last_duration"] = duration
+            self.stats["last_lag"] = cycle_lag
+            self.stats["max_lag"] = max(self.stats["max_lag"], cycle_lag)
+            logger.debug(f"Spawn cycle {cycle} took {duration:.3f}s (lag {cycle_lag:.3f}s)")
+            cycle += 1
+            behind = time.monotonic() - (start + cycle * self.period)
+            if behind > 0:
+                # Overran: skip the missed cycles instead of bursting to catch up
+                skipped = int(behind // self.period) + 1
+                self.stats["overruns"] += 1
+                logger.warning(f"Spawn cycle overran by {behind:.3f}s, skipping {skipped} cycle(s)")
+                cycle += skipped
+
+    def spawn_rate(self, guild, now):
+        multiplier = self.bot.entitlements.guild_spawn_multiplier(guild.id, guild.owner_id, now)
+        return self.config["spawn_rates"]["base"] * multiplier
+
+    def pick_channel(self, guild):
+        chan_id = self.config.get("default_announce_channel")
+        return guild.get_channel(chan_id) if chan_id else guild.system_channel
+
+    async def run_bucket(self, guilds):
+        now = int(datetime.utcnow().timestamp())
+        expires_at = now + SPAWN_TTL
+        spawns = []
+        for guild in guilds:
+            if random.random() > self.spawn_rate(guild, now):
+                continue
+            channel = self.pick_channel(guild)
+            if not channel:
+                continue
+            npc_templates = self.bot.npc_registry.sample("spawn", random.randint(1, 3))
+            if npc_templates:
+                spawns.append((guild, channel, npc_templates))
+        if not spawns:
+            return
+        live = []
+        async with db_ctx(self.bot.db) as db:
+            await db.execute("BEGIN")
+            try:
+                for guild, channel, npcs in spawns:
+                    npc_ids = [npc["id"] for npc in npcs]
+                    cursor = await db.execute(
+                        "INSERT INTO active_spawns (guild_id, channel_id, npc_ids, spawn_type, expires_at) VALUES (?, ?, ?, ?, ?)",
+                        (guild.id, channel.id, json.dumps(npc_ids), "spawn", expires_at)
+                    )
+                    live.append(LiveSpawn(cursor.lastrowid, guild.id, channel.id, npc_ids, expires_at, time.time()))
+                    await cursor.close()
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        for spawn in live:
+            self.bot.spawn_registry.add(spawn)
+            self.bot.spawn_expiry.track(spawn.id, expires_at)
+        self.stats["spawned"] += len(spawns)
+        for spawn, (guild, channel, npcs) in zip(live, spawns):
+            task = asyncio.create_task(self.announce(spawn.id, channel, npcs, expires_at))
+            self.pending_sends.add(task)
+            task.add_done_callback(self.pending_sends.discard)
+
+    async def announce(self, spawn_id, channel, npcs, expires_at):
+        async with self.send_limit:
+            try:
+                message = await channel.send(embed=make_spawn_embed(npcs, expires_at))
+            except Exception as e:
+                logger.warning(f"Spawn announcement failed in channel {channel.id}: {e}")
+                return
+        spawn = self.bot.spawn_registry.by_id.get(spawn_id)
+        if spawn is not None:
+            spawn.announced_at = message.created_at.timestamp()
+        try:
+            await self.bot.spawn_expiry.set_message(spawn_id, channel.id, message.id)
+        except Exception as e:
+            logger.warning(f"Could not record announcement for spawn {spawn_id}: {e}")
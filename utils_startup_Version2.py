@@ -0,0 +1,56 @@
+import hashlib
+import json
+import logging
+import time
+from contextlib import contextmanager
+from utils.db import db_ctx
+
+logger = logging.getLogger("elysium.startup")
+
+class StartupProfiler:
+    # Wall-clock timings of the startup phases, logged as one report once the bot is up
+
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases = []
+
+    def record(self, name, seconds):
+        self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def report(self):
+        width = max((len(name) for name, _ in self.phases), default=0)
+        lines = [f"  {name:<{width}}  {seconds * 1000:8.1f} ms" for name, seconds in self.phases]
+        lines.append(f"  {'total':<{width}}  {self.elapsed() * 1000:8.1f} ms")
+        return "Startup timings:\n" + "\n".join(lines)
+
+def command_tree_hash(tree):
+    # Hash of the payload a sync would upload; unchanged hash means nothing to sync
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands()), key=lambda c: c["name"])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+async def sync_command_tree(bot):
+    # Returns True when the tree was synced, False when Discord already has it
+    digest = command_tree_hash(bot.tree)
+    async with db_ctx(bot.db, readonly=True) as db:
+        async with db.execute("SELECT value FROM settings WHERE key='command_tree_hash'") as cursor:
+            row = await cursor.fetchone()
+    if row and row[0] == digest:
+        return False
+    await bot.tree.sync()
+    await bot.db.commit_write(
+        "INSERT INTO settings(key, value) VALUES ('command_tree_hash', ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (digest,)
+    )
+    logger.info(f"Command tree synced ({len(bot.tree.get_commands())} commands)")
+    return True
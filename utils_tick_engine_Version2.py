@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("elysium.tick")
+
+class TickPhase:
+    __slots__ = ("name", "func", "every", "runs", "last", "total", "max", "errors")
+
+    def __init__(self, name, func, every):
+        self.name = name
+        self.func = func
+        self.every = max(1, every)
+        self.runs = 0
+        self.last = 0.0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+
+    def timings(self):
+        return {
+            "runs": self.runs,
+            "last": self.last,
+            "avg": self.total / self.runs if self.runs else 0.0,
+            "max": self.max,
+            "errors": self.errors,
+        }
+
+class TickEngine:
+    # Runs registered phases in registration order on a fixed schedule. Deadlines are
+    # computed from the start time (start + n * interval), so sleep jitter and tick
+    # duration never accumulate as drift. When a tick overruns, up to `max_catchup`
+    # missed ticks run back to back and any beyond that are skipped; skipped ticks still
+    # advance the tick counter, so `every`-N phases stay on the same tick numbers.
+
+    def __init__(self, interval, max_catchup=0):
+        self.interval = interval
+        self.max_catchup = max_catchup
+        self.phases = []
+        self.tick_count = 0
+        self.stats = {"ticks": 0, "skipped": 0, "overruns": 0, "last_duration": 0.0, "last_lag": 0.0}
+
+    def register(self, name, func, every=1):
+        # func is a zero-argument coroutine function; `every` runs it on every Nth tick
+        self.unregister(name)
+        self.phases.append(TickPhase(name, func, every))
+
+    def unregister(self, name):
+        self.phases = [phase for phase in self.phases if phase.name != name]
+
+    def timings(self):
+        return {phase.name: phase.timings() for phase in self.phases}
+
+    async def tick(self):
+        tick_no = self.tick_count
+        self.tick_count += 1
+        start = time.perf_counter()
+        for phase in list(self.phases):
+            if tick_no % phase.every:
+                continue
+            phase_start = time.perf_counter()
+            try:
+                await phase.func()
+            except Exception as e:
+                phase.errors += 1
+                logger.error(f"Tick phase {phase.name} failed: {e}")
+            elapsed = time.perf_counter() - phase_start
+            phase.runs += 1
+            phase.last = elapsed
+            phase.total += elapsed
+            phase.max = max(phase.max, elapsed)
+        duration = time.perf_counter() - start
+        self.stats["ticks"] += 1
+        self.stats["last_duration"] = duration
+        return duration
+
+    async def run(self):
+        start = time.monotonic()
+        scheduled = 0
+        while True:
+            due = start + scheduled * self.interval
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.stats["last_lag"] = max(0.0, time.monotonic() - due)
+            await self.tick()
+            scheduled += 1
+            missed = int((time.monotonic() - start) // self.interval) - scheduled + 1
+            if missed > 0:
+                self.stats["overruns"] += 1
+                skip = max(0, missed - self.max_catchup)
+                if skip:
+                    self.stats["skipped"] += skip
+                    self.tick_count += skip
+                    scheduled += skip
+                    logger.warning(f"World tick overran, skipping {skip} tick(s)")
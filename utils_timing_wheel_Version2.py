@@ -0,0 +1,92 @@
+class TimingWheel:
+    # Hierarchical timing wheel. Level 0 has one slot per `tick` seconds; each higher
+    # level has one slot per full turn of the level below. Deadlines past the top level
+    # wait in an overflow bucket. add/cancel are O(1); advance() cascades each higher
+    # level slot down once per turn of the level below it.
+
+    def __init__(self, tick=1.0, slots=(64, 64, 64), start=0.0):
+        self.tick = tick
+        self.sizes = tuple(slots)
+        self.spans = []
+        span = 1
+        for size in self.sizes:
+            self.spans.append(span)
+            span *= size
+        self.horizon = span
+        self.levels = [[{} for _ in range(size)] for size in self.sizes]
+        self.overflow = {}
+        self.ready = {}
+        self.where = {}
+        self.current = int(start // tick)
+
+    def __len__(self):
+        return len(self.where)
+
+    def __contains__(self, key):
+        return key in self.where
+
+    def add(self, key, deadline):
+        # Re-adding a key moves it to the new deadline
+        self.cancel(key)
+        self._place(key, self._due_tick(deadline), deadline)
+
+    def _place(self, key, due, deadline):
+        delta = due - self.current
+        if delta <= 0:
+            bucket = self.ready
+        else:
+            for level, size in enumerate(self.sizes):
+                span = self.spans[level]
+                if delta < span * size:
+                    bucket = self.levels[level][(due // span) % size]
+                    break
+            else:
+                bucket = self.overflow
+        bucket[key] = deadline
+        self.where[key] = bucket
+
+    def _due_tick(self, deadline):
+        # Round up so nothing fires before its deadline
+        return int(-(-deadline // self.tick))
+
+    def cancel(self, key):
+        bucket = self.where.pop(key, None)
+        if bucket is not None:
+            del bucket[key]
+            return True
+        return False
+
+    def advance(self, now):
+        # Moves the wheel up to `now` and returns {key: deadline} for everything due
+        due = self.ready
+        self.ready = {}
+        target = int(now // self.tick)
+        while self.current < target:
+            self.current += 1
+            if self.current % self.horizon == 0 and self.overflow:
+                bucket, self.overflow = self.overflow, {}
+                self._cascade(bucket)
+            for level in range(len(self.sizes) - 1, 0, -1):
+                span = self.spans[level]
+                if self.current % span == 0:
+                    slot = (self.current // span) % self.sizes[level]
+                    bucket = self.levels[level][slot]
+                    if bucket:
+                        self.levels[level][slot] = {}
+                        self._cascade(bucket)
+            slot = self.current % self.sizes[0]
+            bucket = self.levels[0][slot]
+            if bucket:
+                self.levels[0][slot] = {}
+                due.update(bucket)
+            if self.ready:
+                due.update(self.ready)
+                self.ready = {}
+        for key in due:
+            self.where.pop(key, None)
+        return due
+
+    def _cascade(self, bucket):
+        for key, deadline in bucket.items():
+            self._place(key, self._due_tick(deadline), deadline)
+
@@ -1,39 +1,52 @@
 import discord
+from utils.components import component_id
 
-class BattleView(discord.ui.View):
-    def __init__(self, battle_id, pve=True):
+MAX_BUTTONS = 25
+
+class RoutedView(discord.ui.View):
+    # Only lays out buttons: clicks are routed by custom_id through utils.components, so
+    # the view must never reach discord.py's ViewStore (one entry per message, kept
+    # forever with timeout=None). Every send and edit path stores a view only when
+    # is_finished() is False, so it always reports True.
+
+    def __init__(self):
         super().__init__(timeout=None)
+
+    def is_finished(self):
+        return True
+
+class BattleView(RoutedView):
+    def __init__(self, battle_id, pve=True):
+        super().__init__()
         self.battle_id = battle_id
         self.pve = pve
-        self.add_item(discord.ui.Button(label="Attack", custom_id=f"battle_{battle_id}_attack", style=discord.ButtonStyle.red))
-        self.add_item(discord.ui.Button(label="Defend", custom_id=f"battle_{battle_id}_defend", style=discord.ButtonStyle.green))
-        self.add_item(discord.ui.Button(label="Special", custom_id=f"battle_{battle_id}_special", style=discord.ButtonStyle.blurple))
+        self.add_item(discord.ui.Button(label="Attack", custom_id=component_id("battle", battle_id, "attack"), style=discord.ButtonStyle.red))
+        self.add_item(discord.ui.Button(label="Defend", custom_id=component_id("battle", battle_id, "defend"), style=discord.ButtonStyle.green))
+        self.add_item(discord.ui.Button(label="Special", custom_id=component_id("battle", battle_id, "special"), style=discord.ButtonStyle.blurple))
 
-class TradeView(discord.ui.View):
+class TradeView(RoutedView):
     def __init__(self, offers):
-        super().__init__(timeout=None)
-        for offer in offers:
+        super().__init__()
+        for offer in offers[:MAX_BUTTONS - 1]:
             self.add_item(discord.ui.Button(
                 label=f"Accept {offer['item_type']} #{offer['item_id']}",
-                custom_id=f"trade_{offer['id']}_accept",
+                custom_id=component_id("trade", offer["id"], "accept"),
                 style=discord.ButtonStyle.green
             ))
 
-class CraftingView(discord.ui.View):
+class MarketView(TradeView):
+    # Accept buttons for one page of offers plus a Next button carrying the keyset cursor
+    def __init__(self, offers, next_id=None):
+        super().__init__(offers)
+        if next_id:
+            self.add_item(discord.ui.Button(label="Next", custom_id=next_id, style=discord.ButtonStyle.secondary))
+
+class CraftingView(RoutedView):
     def __init__(self, recipes):
-        super().__init__(timeout=None)
-        for recipe in recipes:
+        super().__init__()
+        for recipe in recipes[:MAX_BUTTONS]:
             self.add_item(discord.ui.Button(
                 label=f"Craft {recipe['name']}",
-                custom_id=f"craft_{recipe['id']}_start",
+                custom_id=component_id("craft", recipe["id"], "start"),
                 style=discord.ButtonStyle.blurple
             ))
-
-class PaginationView(discord.ui.View):
-    def __init__(self, total_pages, current_page=1):
-        super().__init__(timeout=None)
-        self.total_pages = total_pages
-        self.current_page = current_page
-        self.add_item(discord.ui.Button(label="Previous", custom_id="page_prev", style=discord.ButtonStyle.secondary))
-        self.add_item(discord.ui.Button(label=f"Page {current_page}/{total_pages}", disabled=True, style=discord.ButtonStyle.gray))
-        self.add_item(discord.ui.Button(label="Next", custom_id="page_next", style=discord.ButtonStyle.secondary))
\ No newline at end of file
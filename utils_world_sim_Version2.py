@@ -0,0 +1,53 @@
+import numpy as np
+from datetime import datetime
+
+MIGRATION_CHANCE = 0.03
+CONVERSION_CHANCE = 0.005
+
+class NPCColumns:
+    # Active world NPC population as compact column arrays
+    __slots__ = ("ids", "is_scout", "converted")
+
+    def __init__(self, rows):
+        n = len(rows)
+        self.ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=n)
+        self.is_scout = np.fromiter((row[1] == "scout" for row in rows), dtype=bool, count=n)
+        self.converted = np.fromiter((bool(row[2]) for row in rows), dtype=bool, count=n)
+
+    def __len__(self):
+        return len(self.ids)
+
+def roll_npc_tick(npcs, rng):
+    # One draw per NPC and outcome, in a fixed order so a seeded rng replays exactly
+    rolls = rng.random((2, len(npcs)))
+    migrate = rolls[0] < MIGRATION_CHANCE
+    convert = (rolls[1] < CONVERSION_CHANCE) & ~npcs.converted
+    return migrate, convert
+
+async def load_active_npcs(db):
+    async with db.execute("SELECT id, job, converted_to_collectible FROM world_npcs WHERE status='active'") as cursor:
+        rows = await cursor.fetchall()
+    return NPCColumns(rows)
+
+async def simulate_npc_tick(db, rng, now=None):
+    npcs = await load_active_npcs(db)
+    if not len(npcs):
+        return 0, 0
+    migrate, convert = roll_npc_tick(npcs, rng)
+    now = now or int(datetime.utcnow().timestamp())
+    new_jobs = np.where(npcs.is_scout[migrate], "worker", "scout")
+    migrated = [(job, now, npc_id) for job, npc_id in zip(new_jobs.tolist(), npcs.ids[migrate].tolist())]
+    converted = [(npc_id,) for npc_id in npcs.ids[convert].tolist()]
+    if not migrated and not converted:
+        return 0, 0
+    await db.execute("BEGIN")
+    try:
+        if migrated:
+            await db.executemany("UPDATE world_npcs SET job=?, migrated_at=? WHERE id=?", migrated)
+        if converted:
+            await db.executemany("UPDATE world_npcs SET converted_to_collectible=1 WHERE id=?", converted)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return len(migrated), len(converted)